@@ -0,0 +1,199 @@
+#!/usr/bin/env Python3
+#  Benchmark.py
+#  TempReadings
+#
+#  Copyright(c) 2017.  All Rights Reserved.
+# -------------------------------------------------------
+
+"""Times the headless pipeline on synthetic 8500_RCTT.json exports
+Usage:   python Benchmark.py --sizes 1000 100000 10000000 --ratios 0.01 0.25
+         python Benchmark.py --compare
+
+Each size/ratio case runs in a fresh process so its peak memory is its own. Results are
+appended as JSON lines to Benchmarks/results.jsonl together with the git commit, so runs
+on different commits can be compared with --compare.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+import numpy
+
+from TempReader import PLOT_IMAGE, PLOT_IMAGE_FILTERED, PLOT_POINTS, REPORT_FILE, STAGE_WORKERS, LoadReadings, \
+    Metrics, OutputGraph, ReadingCache, WriteImages, WritePlot, WriteReport, WriteTable
+
+BENCH_DIR = "Benchmarks"
+RESULTS_FILE = BENCH_DIR + os.sep + "results.jsonl"
+SIZES = (1000, 100000, 10000000)
+RATIOS = (0.05,)
+# RenderOutputs writes all the outputs again through the task graph, to compare with the sum of the stages
+STAGES = ("ReadData", "CacheRead", "WritePlot", "WriteTable", "WriteImages", "WriteReport", "RenderOutputs")
+# the PDF report draws every row, which takes hours at ten million readings
+REPORT_LIMIT = 100000
+
+RECORD = ('{{"Date": "{0}", "Time": "{1}", "AvgTemp": {2}, "HighRange": 15.0, "LowRange": 2.0, '
+          '"Status": "{3}", "SN": "{4}"}}')
+
+
+def GenerateExport(path, rows, outOfLimit=0.05, serials=4, seed=0, chunkRows=100000):
+    """
+    Write a synthetic export in the 8500_RCTT.json layout: readings a few minutes apart from
+    several carousels, with roughly the outOfLimit fraction outside the 2-15 degree range
+    """
+    random = numpy.random.RandomState(seed)
+    names = ["16FMP{0:05d}".format(32 + number) for number in range(serials)]
+    start = numpy.datetime64("2016-01-01T00:00:00")
+    with open(path, 'w', buffering=1024 * 1024) as file:
+        file.write('{"Header": {"Instrument": "8500", "Version": 1.5},\n "Readings": [\n')
+        stamp = start
+        for first in range(0, rows, chunkRows):
+            count = min(chunkRows, rows - first)
+            stamps = stamp + numpy.cumsum(random.randint(60, 600, count)).astype('timedelta64[s]')
+            stamp = stamps[-1]
+            temps = numpy.round(random.normal(8.5, 2.0, count).clip(2.1, 14.9), 1)
+            bad = random.random_sample(count) < outOfLimit
+            temps[bad] = numpy.round(numpy.where(random.random_sample(bad.sum()) < 0.5,
+                                                 random.uniform(-2.0, 1.9, bad.sum()),
+                                                 random.uniform(15.1, 20.0, bad.sum())), 1)
+            days = numpy.datetime_as_string(stamps, unit='D').tolist()
+            seconds = (stamps - stamps.astype('datetime64[D]')).astype(numpy.int64).tolist()
+            times = ["{0:02d}:{1:02d}:{2:02d} {3}".format((value // 3600) % 12 or 12, value // 60 % 60, value % 60,
+                                                          "PM" if value >= 43200 else "AM") for value in seconds]
+            sns = [names[code] for code in random.randint(0, serials, count).tolist()]
+            lines = [RECORD.format(day, time, temp, "Fail" if fail else "Pass", sn)
+                     for day, time, temp, fail, sn in zip(days, times, temps.tolist(), bad.tolist(), sns)]
+            file.write((",\n" if first else "") + ",\n".join(lines))
+        file.write('\n],\n "Trailer": {"Records": %d}}\n' % rows)
+    return path
+
+
+def DataFile(rows, ratio):
+    """
+    Synthetic export for a case, generated on first use and kept for later runs
+    """
+    path = os.path.join(BENCH_DIR, "data", "rctt-{0}-{1}.json".format(rows, ratio))
+    if not os.path.isfile(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        logging.info("Generating {0} readings in {1}".format(rows, path))
+        GenerateExport(path + ".tmp", rows, ratio)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def RunCase(path, stages, maxPoints=PLOT_POINTS):
+    """
+    Run the pipeline stages on one export and return the stage records.
+    Called in a fresh worker process, so processPeakMB is the high-water mark of this case alone.
+    """
+    records = []
+    metrics = Metrics(None, report=records.append)
+    with tempfile.TemporaryDirectory() as outDir:
+        with metrics.Stage("ReadData", path) as stage:
+            readings = LoadReadings(path)
+            stage["rows"] = len(readings)
+        rows = len(readings)
+        if "CacheRead" in stages:
+            cache = ReadingCache(os.path.join(outDir, "Cache"))
+            key = cache.Key(path)
+            cache.Put(key, readings)
+            with metrics.Stage("CacheRead", path, rows):
+                cache.Get(key)
+        figure = None
+        if "WritePlot" in stages:
+            with metrics.Stage("WritePlot", path, rows):
+                figure = WritePlot(readings, os.path.join(outDir, "plot.html"), maxPoints)
+        if "WriteTable" in stages:
+            with metrics.Stage("WriteTable", path, rows):
+                WriteTable(readings, os.path.join(outDir, "HTMLTable.html"))
+        image = None
+        if "WriteImages" in stages:
+            with metrics.Stage("WriteImages", path, rows):
+                image = WriteImages(readings, os.path.join(outDir, PLOT_IMAGE),
+                                    os.path.join(outDir, PLOT_IMAGE_FILTERED), maxPoints, figure)[0]
+        if "WriteReport" in stages and rows <= REPORT_LIMIT:
+            with metrics.Stage("WriteReport", path, rows):
+                WriteReport(readings, os.path.join(outDir, REPORT_FILE), image)
+        if "RenderOutputs" in stages:
+            graphDir = os.path.join(outDir, "Graph")
+            os.makedirs(graphDir)
+            graph = OutputGraph(readings, graphDir, rows <= REPORT_LIMIT, maxPoints)
+            with ThreadPoolExecutor(max_workers=STAGE_WORKERS) as pool:
+                with metrics.Stage("RenderOutputs", path, rows):
+                    graph.Run(pool)
+    return [record for record in records if record["stage"] in stages]
+
+
+def Commit():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+        return commit.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def Compare(path):
+    """
+    Stage timings of the last two commits in the results file, side by side
+    """
+    runs = OrderedDict()
+    with open(path) as file:
+        for line in file:
+            record = json.loads(line)
+            runs.setdefault(record["commit"], {})[(record["readings"], record["ratio"], record["stage"])] = record
+    if len(runs) < 2:
+        print("Need results from two commits to compare")
+        return 1
+    (old, before), (new, after) = list(runs.items())[-2:]
+    print("{0:>10} {1:>6} {2:<12} {3:>10} {4:>10} {5:>8}".format("readings", "ratio", "stage", old, new, "change"))
+    for key in sorted(set(before) & set(after)):
+        was, now = before[key]["seconds"], after[key]["seconds"]
+        print("{0:>10} {1:>6} {2:<12} {3:>9.3f}s {4:>9.3f}s {5:>+7.0%}".format(key[0], key[1], key[2], was, now,
+                                                                            now / was - 1 if was else 0))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmark", description="Benchmark the temperature reader pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="readings per export")
+    parser.add_argument("--ratios", type=float, nargs="+", default=RATIOS, help="out-of-limit fractions")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES, help="stages to time")
+    parser.add_argument("--points", type=int, default=PLOT_POINTS, help="maximum plotted points")
+    parser.add_argument("--results", default=RESULTS_FILE, help="JSON-lines results file")
+    parser.add_argument("--compare", action="store_true", help="compare the last two commits in the results file")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+    if args.compare:
+        return Compare(args.results)
+
+    run = {"commit": Commit(), "time": datetime.now().isoformat(timespec="seconds"),
+           "python": platform.python_version(), "numpy": numpy.__version__, "machine": platform.machine()}
+    os.makedirs(os.path.dirname(args.results) or ".", exist_ok=True)
+    for rows in args.sizes:
+        for ratio in args.ratios:
+            path = DataFile(rows, ratio)
+            # a fresh process per case keeps peak memory from leaking between cases
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                records = pool.submit(RunCase, path, args.stages, args.points).result()
+            with open(args.results, 'a') as file:
+                for record in records:
+                    record.update(run, readings=rows, ratio=ratio, fileMB=round(os.path.getsize(path) / 1048576.0, 1))
+                    file.write(json.dumps(record) + "\n")
+                    print("{0:>10} {1:>6} {2:<12} {3:>9.3f}s {4:>12} rows/s {5:>8} MB".format(
+                        rows, ratio, record["stage"], record["seconds"], record.get("rowsPerSecond", ""),
+                        record["peakMB"]))
+    print("Results appended to {0}".format(args.results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
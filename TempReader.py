@@ -0,0 +1,2709 @@
+#!/usr/bin/env Python3
+#  TempReader.py
+#  TempReadings
+#  
+#  Copyright(c) 2017.  All Rights Reserved.
+# -------------------------------------------------------
+
+"""Reading, plotting and report logic of the temperature reader, importable without Qt
+Usage:   python TempReader.py render 8500_RCTT.json --out Plots --pdf
+         python TempReader.py batch Exports --out Plots/Batch --pdf --shared --gzip
+         python TempReader.py serve 8500_RCTT.json --port 5006
+         python TempReader.py convert Exports/*.json --to .arrow
+
+"""
+import argparse
+import asyncio
+import codecs
+import copy
+import cProfile
+import csv
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import re
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+from array import array
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import partial
+from html import escape
+
+import fpdf
+import numpy
+from bokeh import __version__ as BOKEH_VERSION
+from bokeh.embed import components, file_html
+from bokeh.io import export_png
+from bokeh.layouts import column
+from bokeh.models import CDSView, ColumnDataSource, GroupFilter, HoverTool, IndexFilter
+from bokeh.palettes import Category10, Category20
+from bokeh.plotting import figure, save
+from bokeh.resources import CDN, INLINE, Resources
+
+HTML_STYLE = """
+<html>
+<head>
+<style>
+table{
+        width: 100%;
+        border-collapse: collapse;
+        font-family: Arial, serif;
+    }
+
+    th{
+        height: 5px;
+        text-align: center;
+        background-color: #003366;;
+        color: white;
+        border: 1px solid #008CBA;
+    }
+
+    td{
+        height: 5px;
+        text-align: center;
+        border: 1px solid #008CBA;
+        font-size: 13px;
+    }
+    </style>
+    </head>
+"""
+HTML_SUMMARY_HEAD = """
+    <div style=overflow - x: auto;>
+    <table id="summary">
+    <tr>
+    <th>SN</th>
+    <th>Readings</th>
+    <th>Min</th>
+    <th>Max</th>
+    <th>Mean</th>
+    <th>Out of Limit</th>
+    <th>Longest Excursion</th>
+    </tr>
+"""
+HTML_SUMMARY_END = "</table></div><br>"
+HTML_READINGS_HEAD = """
+    <div style=overflow - x: auto;>
+    <table id="readings">
+    <tr>
+    <th>Date</th>
+    <th>Time</th>
+    <th>Temp</th>
+    <th>High</th>
+    <th>Low</th>
+    <th>Status</th>
+    <th>SN</th>
+    <th>Rolling Mean</th>
+    <th>Rolling Std</th>
+    <th>Time Above</th>
+    <th>Time Below</th>
+    </tr>
+"""
+HTML_EXCURSION_HEAD = """
+    <div style=overflow - x: auto;>
+    <table id="excursions">
+    <tr>
+    <th>SN</th>
+    <th>Start</th>
+    <th>End</th>
+    <th>Duration</th>
+    <th>Readings</th>
+    <th>Peak</th>
+    </tr>
+"""
+HTML_WINDOW = "<p style=\"font-family: Arial, serif; font-size: 13px;\">Rolling statistics over the previous {0}</p>"
+HTML_TABLE_HEAD = HTML_STYLE + HTML_READINGS_HEAD
+HTML_ROW = "<tr><td>{0}</td><td>{1}</td><td>{2}</td><td>{3}</td><td>{4}</td><td>{5}</td><td>{6}</td></tr>"
+HTML_ROW_RED = "<tr style=color:red><td>{0}</td><td>{1}</td><td>{2}</td><td>{3}</td><td>{4}</td><td>{5}</td><td>{6}</td></tr>"
+HTML_READING_ROW = HTML_ROW.replace("</td></tr>", "</td><td>{7}</td><td>{8}</td><td>{9}</td><td>{10}</td></tr>")
+HTML_READING_ROW_RED = HTML_ROW_RED.replace("</td></tr>", "</td><td>{7}</td><td>{8}</td><td>{9}</td><td>{10}</td></tr>")
+# shared mode rows leave out the optional closing tags and colour through the stylesheet
+HTML_COMPACT_ROW = "<tr>" + "".join("<td>{%d}" % cell for cell in range(11))
+HTML_COMPACT_ROW_RED = HTML_COMPACT_ROW.replace("<tr>", "<tr class=r>")
+HTML_EXCURSION_ROW = "<tr style=color:red><td>{0}</td><td>{1}</td><td>{2}</td><td>{3}</td><td>{4}</td><td>{5}</td></tr>"
+HTML_TABLE_END = "</table></div></html>"
+HTML_LINKED_STYLE = '<html><head><meta charset="utf-8"><link rel="stylesheet" href="{0}"></head>'
+PLOT_PAGE = ('<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{0}</title>{1}</head>'
+             '<body>{2}{3}</body></html>')
+BATCH_INDEX_HEAD = """
+    <div style=overflow - x: auto;>
+    <table>
+    <tr>
+    <th>File</th>
+    <th>Readings</th>
+    <th>Out of Limit</th>
+    <th>First</th>
+    <th>Last</th>
+    <th>Min</th>
+    <th>Max</th>
+    <th>SN</th>
+    <th>Output</th>
+    </tr>
+"""
+
+PLOT_IMAGE = "img_TempReadingsPlot.png"
+PLOT_IMAGE_FILTERED = "img_OutOfLimitPlot.png"
+REPORT_FILE = "TempReadingsReport.pdf"
+# shared mode writes the table CSS and BokehJS once into this folder and links the pages to it
+STATIC_DIR = "static"
+REPORT_CSS = "report.css"
+
+PDF_COLUMNS = (("Date", 24), ("Time", 24), ("Temp", 16), ("High", 16), ("Low", 16), ("Status", 18), ("SN", 28),
+               ("Mean", 16), ("Std", 16), ("Above", 28), ("Below", 28))
+PDF_EXCURSION_COLUMNS = (("SN", 42), ("Start", 46), ("End", 46), ("Duration", 40), ("Readings", 24), ("Peak", 24))
+PDF_SUMMARY_COLUMNS = (("SN", 42), ("Readings", 24), ("Min", 20), ("Max", 20), ("Mean", 20), ("Out of Limit", 26),
+                       ("Longest Excursion", 88))
+
+METRICS_FILE = "Logs" + os.sep + "metrics.jsonl"
+CACHE_DIR = "Cache"
+PLOT_POINTS = 5000
+PLOT_TICKS = 40
+# beyond this many instruments the legend would cover the plot
+LEGEND_SERIALS = 20
+# trailing window of the rolling statistics, in seconds
+ROLLING_WINDOW = 3600
+# threads running the output stages of one file side by side
+STAGE_WORKERS = 4
+# export fields of a CSV file, and the columns WriteColumnar stores with Date and Time combined
+CSV_FIELDS = ("Date", "Time", "AvgTemp", "HighRange", "LowRange", "Status", "SN")
+COLUMNAR_FIELDS = ("Stamp", "AvgTemp", "HighRange", "LowRange", "Status", "SN")
+
+
+class ReadingStream(object):
+    """
+    Yields the items of the "Readings" array one at a time without loading the whole file.
+    After iterating, offset is the byte position just after the last item (or the opening bracket
+    when there is none), where a stream created with that offset resumes once new readings have
+    been appended. The whitespace and closing bracket after it are left out, since writers
+    appending to the file rewrite those.
+    """
+    def __init__(self, path, offset=None, chunkSize=64 * 1024):
+        self.path = path
+        self.start = offset
+        self.offset = None
+        self.chunkSize = chunkSize
+        self.decoder = json.JSONDecoder()
+        # end of the last item: a character index into buf, or a byte offset once Fill drops it
+        self.end = None
+        self.endOffset = None
+
+    def Fill(self):
+        chunk = self.file.read(self.chunkSize)
+        if not chunk:
+            self.eof = True
+            self.buf += self.text.decode(b"", final=True)
+            return False
+        # keep track of the byte position of buf[0] so offsets survive non-ASCII text
+        if self.end is not None:
+            self.endOffset = self.base + len(self.buf[:self.end].encode("utf-8", "surrogateescape"))
+            self.end = None
+        self.base += len(self.buf[:self.pos].encode("utf-8", "surrogateescape"))
+        self.buf = self.buf[self.pos:] + self.text.decode(chunk)
+        self.pos = 0
+        return True
+
+    def Peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.Fill():
+                return ""
+
+    def Decode(self):
+        self.Peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number running into the buffer edge may still be truncated
+                if self.eof or (end < len(self.buf) and self.buf[end] not in "0123456789.eE+-"):
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            if not self.Fill():
+                value, self.pos = self.decoder.raw_decode(self.buf, self.pos)
+                return value
+
+    def Expect(self, char):
+        if self.Peek() != char:
+            raise ValueError("Malformed reading file, expected '{0}' at offset {1}".format(char, self.pos))
+        self.pos += 1
+
+    def Offset(self):
+        """
+        Byte offset of the end of the last item, encoding the buffer up to it only when asked
+        """
+        if self.end is None:
+            return self.endOffset
+        return self.base + len(self.buf[:self.end].encode("utf-8", "surrogateescape"))
+
+    def __iter__(self):
+        with open(self.path, 'rb') as self.file:
+            self.text = codecs.getincrementaldecoder("utf-8")("surrogateescape")
+            self.buf, self.pos, self.base, self.eof = "", 0, 0, False
+            self.end = self.endOffset = None
+            if self.start is not None:
+                self.file.seek(self.start)
+                self.base = self.start
+            elif not self.FindReadings():
+                return
+            self.end = self.pos
+            while True:
+                char = self.Peek()
+                if char == "]":
+                    self.offset = self.Offset()
+                    return
+                if not char:
+                    raise ValueError("Malformed reading file, unterminated Readings array")
+                if char == ",":
+                    self.pos += 1
+                    continue
+                item = self.Decode()
+                self.end = self.pos
+                yield item
+
+    def FindReadings(self):
+        """
+        Skip to the first item of the top-level "Readings" array, False when there is none
+        """
+        if self.Peek() == "\ufeff":
+            self.pos += 1
+        self.Expect("{")
+        while True:
+            char = self.Peek()
+            if char == "}" or not char:
+                return False
+            if char == ",":
+                self.pos += 1
+                continue
+            key = self.Decode()
+            self.Expect(":")
+            if key == "Readings":
+                self.Expect("[")
+                return True
+            self.Decode()
+
+
+def Fingerprint(path, offset, size=64):
+    """
+    The bytes just before offset, used to tell an appended file from a rewritten one
+    """
+    with open(path, 'rb') as file:
+        file.seek(max(0, offset - size))
+        return file.read(min(offset, size)).hex()
+
+
+def FileStamp(path):
+    """
+    Size and modification time of a file, to notice when one without an append offset changes
+    """
+    stat = os.stat(path)
+    return "{0}:{1}".format(stat.st_size, stat.st_mtime_ns)
+
+
+def SecondsOf(value):
+    """
+    Epoch seconds of a datetime64, datetime or date
+    """
+    return int(numpy.datetime64(value, 's').astype(numpy.int64))
+
+
+def SearchOrdered(stamps, order, value):
+    """
+    First position in order whose stamp is not before value, for stamps sorted through order
+    """
+    low, high = 0, len(order)
+    while low < high:
+        middle = (low + high) // 2
+        if stamps[order[middle]] < value:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def ParseRange(start=None, end=None):
+    """
+    datetime64 bounds for --start/--end text such as 2016-09-01 or 2016-09-01T12:00.
+    A date-only end includes that whole day.
+    """
+    bounds = []
+    for text, inclusive in ((start, False), (end, True)):
+        if not text:
+            bounds.append(None)
+            continue
+        try:
+            value = numpy.datetime64(text)
+        except ValueError:
+            raise ValueError("Invalid date {0}, expected YYYY-MM-DD or YYYY-MM-DDThh:mm".format(text))
+        if inclusive and numpy.datetime_data(value.dtype)[0] in ("Y", "M", "D"):
+            value = value + numpy.timedelta64(1, numpy.datetime_data(value.dtype)[0])
+        bounds.append(value.astype('datetime64[s]'))
+    return tuple(bounds)
+
+
+def ParseWindow(text):
+    """
+    Seconds in a window given as seconds or with an s/m/h/d suffix, e.g. 90, 30m or 6h
+    """
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$", str(text).lower())
+    if not match or float(match.group(1)) <= 0:
+        raise ValueError("Invalid window {0}, expected e.g. 900, 30m, 6h or 1d".format(text))
+    return int(float(match.group(1)) * units[match.group(2) or "s"])
+
+
+def ParseTime(text):
+    """
+    Seconds since midnight for a reading time such as "07:10:52 AM"
+    """
+    clock, _, meridiem = text.strip().partition(" ")
+    parts = [int(part) for part in clock.split(":")]
+    hours, minutes, seconds = (parts + [0, 0])[:3]
+    meridiem = meridiem.strip().upper()
+    if meridiem == "PM" and hours < 12:
+        hours += 12
+    elif meridiem == "AM" and hours == 12:
+        hours = 0
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def ParseStamps(dates, times):
+    """
+    Parse a batch of Date ("YYYY-MM-DD") and Time ("hh:mm:ss AM") strings into datetime64[s]
+    using fixed-width character arithmetic, falling back to per-row parsing for other layouts
+    """
+    chars = numpy.array(dates, dtype='U10').view(numpy.uint32).reshape(len(dates), 10).astype(numpy.int64) - 48
+    digits = chars[:, [0, 1, 2, 3, 5, 6, 8, 9]]
+    if ((digits >= 0) & (digits <= 9)).all():
+        year = chars[:, 0] * 1000 + chars[:, 1] * 100 + chars[:, 2] * 10 + chars[:, 3]
+        month = chars[:, 5] * 10 + chars[:, 6]
+        day = chars[:, 8] * 10 + chars[:, 9]
+        months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+        monthDays = ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(numpy.int64)
+        if not ((month >= 1) & (month <= 12) & (day >= 1) & (day <= monthDays)).all():
+            raise ValueError("Invalid reading date in {0} .. {1}".format(dates[0], dates[-1]))
+        stamps = (months.astype('datetime64[D]') + (day - 1)).astype('datetime64[s]')
+    else:
+        stamps = numpy.array([date(int(text[0:4]), int(text[5:7]), int(text[8:10])) for text in dates],
+                             dtype='datetime64[D]').astype('datetime64[s]')
+
+    chars = numpy.array(times, dtype='U11').view(numpy.uint32).reshape(len(times), 11).astype(numpy.int64)
+    digits = chars[:, [0, 1, 3, 4, 6, 7]] - 48
+    meridiem = chars[:, 9] | 32  # lower case 'a'/'p', NUL padding stays 32
+    if (((digits >= 0) & (digits <= 9)).all() and (chars[:, [2, 5]] == ord(":")).all()
+            and numpy.isin(meridiem, [ord("a"), ord("p"), 32]).all()):
+        hours = digits[:, 0] * 10 + digits[:, 1]
+        hours = numpy.where(meridiem == 32, hours, hours % 12 + 12 * (meridiem == ord("p")))
+        seconds = hours * 3600 + (digits[:, 2] * 10 + digits[:, 3]) * 60 + digits[:, 4] * 10 + digits[:, 5]
+    else:
+        seconds = numpy.array([ParseTime(text) for text in times], dtype=numpy.int64)
+    return stamps + seconds.astype('timedelta64[s]')
+
+
+def Grow(buffers, name, column, values):
+    """
+    column followed by values. buffers holds the spare-capacity arrays of the column's owner by
+    name: values go into the room after column when column fills the front of its buffer, and
+    otherwise the column moves to a buffer twice its size, so repeated appends stay linear.
+    """
+    count, added = len(column), len(values)
+    buffer = buffers.get(name)
+    if buffer is None or column.base is not buffer or count + added > len(buffer):
+        buffer = buffers[name] = numpy.empty(max(2 * count, count + added), dtype=column.dtype)
+        buffer[:count] = column
+    buffer[count:count + added] = values
+    return buffer[:count + added]
+
+
+class Readings(object):
+    """
+    Columnar store for the readings of one temperature file.
+    Temps and limits are float64 columns, Date and Time are combined into int64 epoch
+    seconds and Status/SN are dictionary encoded into small integer codes.
+    """
+    EPOCH = date(1970, 1, 1).toordinal()
+    BATCH = 8192
+
+    def __init__(self):
+        self.stamps = array('q')
+        self.temps = array('d')
+        self.high = array('d')
+        self.low = array('d')
+        self.status = array('H')
+        self.sn = array('H')
+        self.statusTable = []
+        self.snTable = []
+        self.statusCodes = {}
+        self.snCodes = {}
+        self.pendingDates = []
+        self.pendingTimes = []
+        self.source = None
+        self.offset = None
+        self.fingerprint = None
+        # None until known; timeOrder sorts the rows by time when they are not already
+        self.sortedByTime = None
+        self.timeOrder = None
+        self.serialIndex = None
+        self.analytics = {}
+        self.outOfLimit = None
+        # room for appended rows after the columns, filled by Extend
+        self.buffers = {}
+
+    def __len__(self):
+        return len(self.temps)
+
+    @classmethod
+    def FromFile(cls, path, cancelled=None, offset=None):
+        readings = cls()
+        stream = ReadingStream(path, offset)
+        for count, item in enumerate(stream, 1):
+            readings.Append(item)
+            if cancelled is not None and count % cls.BATCH == 0 and cancelled():
+                raise Cancelled()
+        readings.source = path
+        readings.offset = stream.offset
+        if stream.offset is not None:
+            readings.fingerprint = Fingerprint(path, stream.offset)
+        return readings.Finish()
+
+    def Append(self, item):
+        self.pendingDates.append(item["Date"])
+        self.pendingTimes.append(item["Time"])
+        if len(self.pendingDates) >= self.BATCH:
+            self.Flush()
+        self.temps.append(item["AvgTemp"])
+        self.high.append(item["HighRange"])
+        self.low.append(item["LowRange"])
+        self.status.append(self.Encode(item["Status"], self.statusCodes, self.statusTable))
+        self.sn.append(self.Encode(item["SN"], self.snCodes, self.snTable))
+
+    def AppendColumns(self, dates, times, temps, high, low, status, sn):
+        """
+        Append a batch of rows given as one sequence per export field
+        """
+        self.Flush()
+        self.stamps.frombytes(ParseStamps(dates, times).astype(numpy.int64).tobytes())
+        self.temps.frombytes(numpy.asarray(temps, dtype=numpy.float64).tobytes())
+        self.high.frombytes(numpy.asarray(high, dtype=numpy.float64).tobytes())
+        self.low.frombytes(numpy.asarray(low, dtype=numpy.float64).tobytes())
+        self.status.extend(self.Encode(value, self.statusCodes, self.statusTable) for value in status)
+        self.sn.extend(self.Encode(value, self.snCodes, self.snTable) for value in sn)
+
+    def Flush(self):
+        """
+        Parse the pending Date/Time strings in one batch
+        """
+        if self.pendingDates:
+            stamps = ParseStamps(self.pendingDates, self.pendingTimes)
+            self.stamps.frombytes(stamps.astype(numpy.int64).tobytes())
+            self.pendingDates = []
+            self.pendingTimes = []
+
+    @staticmethod
+    def Encode(value, codes, table):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(table)
+            table.append(value)
+        return code
+
+    def Finish(self):
+        """
+        Expose the filled arrays as NumPy columns sharing the same buffers
+        """
+        self.Flush()
+        self.stamps = numpy.frombuffer(self.stamps, dtype=numpy.int64)
+        self.temps = numpy.frombuffer(self.temps, dtype=numpy.float64)
+        self.high = numpy.frombuffer(self.high, dtype=numpy.float64)
+        self.low = numpy.frombuffer(self.low, dtype=numpy.float64)
+        self.status = numpy.frombuffer(self.status, dtype=numpy.uint16)
+        self.sn = numpy.frombuffer(self.sn, dtype=numpy.uint16)
+        return self
+
+    def Prepare(self, other):
+        """
+        Get another store ready for Extend: remap its Status/SN codes onto this store's tables
+        and work out the rolling statistics of its rows for each cached window. Only reads this
+        store, so it can run on a worker thread while nothing extends the store.
+        """
+        if other.statusTable is not self.statusTable or other.snTable is not self.snTable:
+            status = numpy.array([self.Encode(value, self.statusCodes, self.statusTable)
+                                  for value in other.statusTable], dtype=numpy.uint16)
+            sn = numpy.array([self.Encode(value, self.snCodes, self.snTable) for value in other.snTable],
+                             dtype=numpy.uint16)
+            other.status, other.statusTable, other.statusCodes = status[other.status], self.statusTable, \
+                self.statusCodes
+            other.sn, other.snTable, other.snCodes = sn[other.sn], self.snTable, self.snCodes
+        return len(self), {window: analytics.Prepare(self, other) for window, analytics in list(self.analytics.items())}
+
+    def Extend(self, other, prepared=None):
+        """
+        Append the rows of another store, with prepared as returned by Prepare for it (worked
+        out here when missing or out of date). The columns and the out-of-limit mask grow into
+        spare capacity, and the serial index and rolling statistics take in just the new rows,
+        so each append costs in proportion to the rows it adds.
+        """
+        if prepared is None or prepared[0] != len(self) or other.snTable is not self.snTable:
+            prepared = self.Prepare(other)
+        first, updates = prepared
+        # a time-sorted store stays sorted when the new rows are in order and carry on from its last one
+        sortedByTime = self.sortedByTime and (not first or not len(other) or other.stamps[0] >= self.stamps[-1]) \
+            and bool((other.stamps[1:] >= other.stamps[:-1]).all())
+        if self.outOfLimit is not None:
+            self.outOfLimit = Grow(self.buffers, "outOfLimit", self.outOfLimit, other.OutOfLimit())
+        for name in ("stamps", "temps", "high", "low", "status", "sn"):
+            setattr(self, name, Grow(self.buffers, name, getattr(self, name), getattr(other, name)))
+        self.offset, self.fingerprint = other.offset, other.fingerprint
+        self.sortedByTime = True if sortedByTime else None
+        self.timeOrder = None
+        if self.serialIndex is not None and not self.serialIndex.Extend(first):
+            self.serialIndex = None
+        # readings going back in time change earlier windows, so those are recomputed when next needed
+        analytics = {}
+        for window, cached in self.analytics.items():
+            if updates.get(window) is not None:
+                cached.Extend(updates[window])
+                analytics[window] = cached
+        self.analytics = analytics
+        return other
+
+    def Take(self, index):
+        """
+        New store holding only the given rows, sharing the Status/SN lookup tables
+        """
+        readings = Readings()
+        for name in ("stamps", "temps", "high", "low", "status", "sn"):
+            setattr(readings, name, getattr(self, name)[index])
+        readings.statusTable, readings.statusCodes = self.statusTable, self.statusCodes
+        readings.snTable, readings.snCodes = self.snTable, self.snCodes
+        return readings
+
+    def Snapshot(self):
+        """
+        The readings as they are now, for another thread to read while this store is extended.
+        Extend only writes past the current rows and replaces rather than changes the arrays of
+        the serial index and statistics, so the snapshot shares all of them without copying.
+        """
+        readings = self.Take(slice(0, len(self)))
+        readings.source, readings.offset, readings.fingerprint = self.source, self.offset, self.fingerprint
+        readings.sortedByTime, readings.timeOrder = self.sortedByTime, self.timeOrder
+        readings.outOfLimit = self.outOfLimit
+        if self.serialIndex is not None:
+            readings.serialIndex = copy.copy(self.serialIndex)
+            readings.serialIndex.readings = readings
+        for window, analytics in self.analytics.items():
+            readings.analytics[window] = copy.copy(analytics)
+            readings.analytics[window].buffers = {}
+        return readings
+
+    def Datetimes(self, start=0, stop=None):
+        return self.stamps[start:stop].view('datetime64[s]')
+
+    def TimeOrder(self):
+        """
+        Row order that sorts the readings by time, None when they already are
+        """
+        if self.sortedByTime is None:
+            self.sortedByTime = bool((self.stamps[1:] >= self.stamps[:-1]).all())
+            self.timeOrder = None if self.sortedByTime else numpy.argsort(self.stamps, kind="mergesort")
+        return self.timeOrder
+
+    def Between(self, start=None, end=None):
+        """
+        Readings with start <= time < end in time order; either end may be None.
+        Only the rows in the range are touched: a time-sorted store is sliced without copying,
+        otherwise the time order is binary searched and the matching rows gathered.
+        """
+        order = self.TimeOrder()
+        if order is None:
+            first = 0 if start is None else int(numpy.searchsorted(self.stamps, SecondsOf(start), side="left"))
+            last = len(self) if end is None else int(numpy.searchsorted(self.stamps, SecondsOf(end), side="left"))
+            readings = self.Take(slice(first, max(first, last)))
+            readings.sortedByTime = True
+        else:
+            first = 0 if start is None else SearchOrdered(self.stamps, order, SecondsOf(start))
+            last = len(self) if end is None else SearchOrdered(self.stamps, order, SecondsOf(end))
+            readings = self.Take(order[first:max(first, last)])
+        readings.source, readings.offset, readings.fingerprint = self.source, self.offset, self.fingerprint
+        return readings
+
+    def BySerial(self):
+        if self.serialIndex is None:
+            self.serialIndex = SerialIndex(self)
+        return self.serialIndex
+
+    def Analyze(self, window=ROLLING_WINDOW):
+        if window not in self.analytics:
+            self.analytics[window] = Analytics(self, window)
+        return self.analytics[window]
+
+    def OutOfLimit(self):
+        """
+        Boolean mask of readings outside their low/high range, kept up to date by Extend
+        """
+        if self.outOfLimit is None or len(self.outOfLimit) != len(self):
+            self.outOfLimit = (self.temps < self.low) | (self.temps > self.high)
+        return self.outOfLimit
+
+    def Days(self, start=0, stop=None):
+        """
+        Dates formatted as MM-DD-YYYY
+        """
+        days, index = numpy.unique(self.stamps[start:stop] // 86400, return_inverse=True)
+        labels = [date.fromordinal(int(day) + self.EPOCH).strftime("%m-%d-%Y") for day in days]
+        return numpy.array(labels, dtype=object)[index].tolist()
+
+    def Times(self, start=0, stop=None):
+        """
+        Times formatted as hh:mm:ss AM/PM
+        """
+        times = []
+        for seconds in (self.stamps[start:stop] % 86400).tolist():
+            hours, seconds = divmod(seconds, 3600)
+            minutes, seconds = divmod(seconds, 60)
+            times.append("{0:02d}:{1:02d}:{2:02d} {3}".format(hours % 12 or 12, minutes, seconds,
+                                                             "PM" if hours >= 12 else "AM"))
+        return times
+
+    def Status(self, start=0, stop=None):
+        return numpy.array(self.statusTable, dtype=object)[self.status[start:stop]].tolist()
+
+    def SN(self, start=0, stop=None):
+        return numpy.array(self.snTable, dtype=object)[self.sn[start:stop]].tolist()
+
+
+def ReadAppended(readings):
+    """
+    Readings appended to the source file since readings was parsed. Returns None when the file
+    was rewritten rather than appended to, and an empty store while the writer is mid-record.
+    Files without an append offset, such as CSV and columnar files, count as rewritten once
+    their size or modification time changes.
+    """
+    if readings.source is None:
+        return None
+    if readings.offset is None:
+        if readings.fingerprint is not None and FileStamp(readings.source) == readings.fingerprint:
+            return Readings().Finish()
+        return None
+    if os.path.getsize(readings.source) < readings.offset or \
+            Fingerprint(readings.source, readings.offset) != readings.fingerprint:
+        return None
+    try:
+        return Readings.FromFile(readings.source, offset=readings.offset)
+    except ValueError as ex:
+        logging.debug("Appended readings not complete yet: {0}".format(ex))
+        return Readings().Finish()
+
+
+def ReadJson(path, cancelled=None):
+    return Readings.FromFile(path, cancelled)
+
+
+def ReadCsv(path, cancelled=None, chunkRows=Readings.BATCH):
+    """
+    Readings from a CSV file with a header row naming the export fields
+    (Date, Time, AvgTemp, HighRange, LowRange, Status, SN), parsed a chunk of rows at a time
+    """
+    readings = Readings()
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        rows = csv.reader(file)
+        header = next(rows, None)
+        if header is None:
+            return readings.Finish()
+        header = [name.strip() for name in header]
+        missing = [name for name in CSV_FIELDS if name not in header]
+        if missing:
+            raise ValueError("{0} has no {1} column".format(path, ", ".join(missing)))
+        fields = [header.index(name) for name in CSV_FIELDS]
+        while True:
+            chunk = [row for _, row in zip(range(chunkRows), rows) if row]
+            if not chunk:
+                break
+            columns = list(zip(*chunk))
+            readings.AppendColumns(*[columns[field] for field in fields])
+            if cancelled is not None and cancelled():
+                raise Cancelled()
+    readings.source = path
+    return readings.Finish()
+
+
+def Arrow():
+    """
+    pyarrow, imported on first use since only the Parquet and Arrow readers need it
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as ex:
+        raise ValueError("Reading and writing Parquet or Arrow files needs pyarrow: {0}".format(ex))
+    return pyarrow
+
+
+def ArrowValues(column, dtype):
+    """
+    NumPy view of a table column, without copying when it is a single chunk without nulls
+    """
+    if column.num_chunks == 1 and column.null_count == 0:
+        values = column.chunk(0).to_numpy(zero_copy_only=False)
+    else:
+        values = column.to_numpy()
+    return values.astype(dtype, copy=False)
+
+
+def ArrowCodes(table, name, codes, lookup):
+    """
+    Dictionary codes of a Status/SN column mapped onto the store's lookup table.
+    Columns written by WriteColumnar already match it, so their indices are used as they are.
+    """
+    pyarrow = Arrow()
+    column = table.column(name)
+    if column.null_count:
+        raise ValueError("{0} column has missing values".format(name))
+    if not pyarrow.types.is_dictionary(column.type):
+        column = column.dictionary_encode()
+    parts = []
+    for chunk in column.chunks:
+        mapping = numpy.array([Readings.Encode(value, codes, lookup) for value in chunk.dictionary.to_pylist()],
+                              dtype=numpy.uint16)
+        indices = chunk.indices.to_numpy(zero_copy_only=False)
+        if numpy.array_equal(mapping, numpy.arange(len(mapping))):
+            parts.append(indices.astype(numpy.uint16, copy=False))
+        else:
+            parts.append(mapping[indices])
+    if len(parts) == 1:
+        return parts[0]
+    return numpy.concatenate(parts) if parts else numpy.zeros(0, dtype=numpy.uint16)
+
+
+def FromArrow(table, path):
+    """
+    Readings over the columns of an Arrow table, either as written by WriteColumnar (a Stamp
+    timestamp column) or with the Date and Time strings of the export
+    """
+    pyarrow = Arrow()
+    names = table.column_names
+    fields = COLUMNAR_FIELDS if "Stamp" in names else CSV_FIELDS
+    missing = [name for name in fields if name not in names]
+    if missing:
+        raise ValueError("{0} has no {1} column".format(path, ", ".join(missing)))
+    readings = Readings().Finish()
+    if "Stamp" in names:
+        stamps = table.column("Stamp")
+        if pyarrow.types.is_timestamp(stamps.type):
+            stamps = stamps.cast(pyarrow.timestamp("s")).cast(pyarrow.int64())
+        readings.stamps = ArrowValues(stamps, numpy.int64)
+    else:
+        readings.stamps = ParseStamps(table.column("Date").to_pylist(),
+                                      table.column("Time").to_pylist()).astype(numpy.int64)
+    readings.temps = ArrowValues(table.column("AvgTemp"), numpy.float64)
+    readings.high = ArrowValues(table.column("HighRange"), numpy.float64)
+    readings.low = ArrowValues(table.column("LowRange"), numpy.float64)
+    readings.status = ArrowCodes(table, "Status", readings.statusCodes, readings.statusTable)
+    readings.sn = ArrowCodes(table, "SN", readings.snCodes, readings.snTable)
+    readings.source = path
+    return readings
+
+
+def ReadParquet(path, cancelled=None):
+    pyarrow = Arrow()
+    return FromArrow(pyarrow.parquet.read_table(path, memory_map=True), path)
+
+
+def ReadArrow(path, cancelled=None):
+    """
+    Readings from an Arrow IPC (Feather v2) file. The file is memory mapped, so the columns of
+    an uncompressed file are views of the mapped pages rather than copies.
+    """
+    pyarrow = Arrow()
+    source = pyarrow.memory_map(path, 'r')
+    try:
+        table = pyarrow.ipc.open_file(source).read_all()
+    except pyarrow.ArrowInvalid:
+        source.seek(0)
+        table = pyarrow.ipc.open_stream(source).read_all()
+    return FromArrow(table, path)
+
+
+READERS = {".json": ReadJson, ".csv": ReadCsv, ".parquet": ReadParquet, ".pq": ReadParquet,
+           ".arrow": ReadArrow, ".feather": ReadArrow, ".ipc": ReadArrow}
+
+
+def ReadFile(path, cancelled=None):
+    """
+    Readings from a file in any of the READERS formats, chosen by its extension
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in READERS:
+        raise ValueError("Unsupported temperature file type {0}, expected one of {1}".format(
+            extension or path, " ".join(sorted(READERS))))
+    stamp = FileStamp(path)
+    readings = READERS[extension](path, cancelled)
+    if readings.offset is None:
+        readings.fingerprint = stamp
+    return readings
+
+
+def WriteColumnar(readings, path, rowGroupRows=1024 * 1024):
+    """
+    Write the readings to a Parquet file, or an uncompressed Arrow IPC file that ReadArrow
+    can memory map, according to the extension of path
+    """
+    pyarrow = Arrow()
+    extension = os.path.splitext(path)[1].lower()
+    if READERS.get(extension) not in (ReadParquet, ReadArrow):
+        raise ValueError("Columnar output must be .parquet or .arrow, not {0}".format(extension or path))
+    columns = [numpy.ascontiguousarray(getattr(readings, name))
+               for name in ("stamps", "temps", "high", "low", "status", "sn")]
+    table = pyarrow.table([
+        pyarrow.array(columns[0].view('datetime64[s]')),
+        pyarrow.array(columns[1]),
+        pyarrow.array(columns[2]),
+        pyarrow.array(columns[3]),
+        pyarrow.DictionaryArray.from_arrays(pyarrow.array(columns[4]), pyarrow.array(readings.statusTable,
+                                                                                     pyarrow.string())),
+        pyarrow.DictionaryArray.from_arrays(pyarrow.array(columns[5]), pyarrow.array(readings.snTable,
+                                                                                     pyarrow.string()))],
+        names=list(COLUMNAR_FIELDS))
+    temp = path + ".tmp"
+    if READERS[extension] is ReadParquet:
+        pyarrow.parquet.write_table(table, temp, row_group_size=rowGroupRows)
+    else:
+        with pyarrow.OSFile(temp, 'wb') as sink:
+            with pyarrow.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    os.replace(temp, path)
+    return path
+
+
+def ConvertFile(path, output=None, format=".arrow"):
+    """
+    Convert a temperature file to the columnar format, next to it unless output is given
+    """
+    if output is None:
+        output = os.path.splitext(path)[0] + format
+    readings = ReadFile(path)
+    WriteColumnar(readings, output)
+    logging.info("Converted {0} readings from {1} to {2}".format(len(readings), path, output))
+    return output
+
+
+class Analytics(object):
+    """
+    Rolling mean and standard deviation of each instrument's temperature over a trailing time
+    window, the time it spent above and below its limits within that window, and its excursions
+    (runs of consecutive out-of-limit readings).
+    Everything is computed with prefix sums and searchsorted over the readings sorted by SN and
+    time, so the cost is linear in the readings apart from that one sort.
+    Per-reading columns are in the row order of the readings. Readings appended later only
+    reach back to the tail of their instrument's window and its running excursion, so Prepare
+    and Extend add them without touching the earlier rows.
+    """
+    FIELDS = ("serial", "start", "end", "rows", "peak", "excess")
+
+    def __init__(self, readings, window=ROLLING_WINDOW):
+        self.window = window
+        self.snTable = readings.snTable
+        self.buffers = {}
+        index = readings.BySerial()
+        order = index.Order()
+        count = len(order)
+        self.mean = numpy.zeros(count)
+        self.std = numpy.zeros(count)
+        self.above = numpy.zeros(count, dtype=numpy.int64)
+        self.below = numpy.zeros(count, dtype=numpy.int64)
+        # excursions that have ended, and by SN code the (start, end, rows, peak, excess) of the
+        # ones still running at the instrument's latest reading
+        self.excursions = {name: numpy.zeros(0, dtype=numpy.int64) for name in ("serial", "start", "end", "rows")}
+        self.excursions["peak"] = numpy.zeros(0)
+        self.excursions["excess"] = numpy.zeros(0)
+        self.running = {}
+        # rows recent enough to fall in the window of a reading appended to their instrument
+        self.tail = numpy.zeros(0, dtype=numpy.int64)
+        if not count:
+            return
+
+        stamps = readings.stamps[order]
+        temps = readings.temps[order]
+        high = readings.high[order]
+        low = readings.low[order]
+        group = numpy.repeat(numpy.arange(len(index)), index.counts)
+        mean, std, above, below = Rolling(stamps, temps, high, low, group, window)
+        self.mean[order] = mean
+        self.std[order] = std
+        self.above[order] = above
+        self.below[order] = below
+        self.tail = order[stamps > numpy.repeat(stamps[index.stops - 1], index.counts) - window].astype(numpy.int64)
+
+        bad = (temps > high) | (temps < low)
+        runStarts, runStops = Runs(bad, index.starts)
+        if len(runStarts):
+            excess = numpy.maximum(temps - high, low - temps)
+            peaks = Peaks(excess, bad, runStarts)
+            excursions = {"serial": index.codes[group[runStarts]].astype(numpy.int64),
+                          "start": stamps[runStarts], "end": stamps[runStops - 1],
+                          "rows": (runStops - runStarts).astype(numpy.int64), "peak": temps[peaks],
+                          "excess": excess[peaks]}
+            running = runStops == index.stops[group[runStarts]]
+            self.excursions = {name: values[~running] for name, values in excursions.items()}
+            self.running = {code: tuple(run) for code, *run in
+                            zip(*[excursions[name][running].tolist() for name in self.FIELDS])}
+
+    def Prepare(self, readings, new):
+        """
+        Statistics of the readings in new, about to be appended to readings and already sharing
+        its Status/SN tables, for Extend. Only the tails of the instruments' windows are read, so
+        the cost depends on the new readings. None when a new reading goes back before the
+        latest one of its instrument, which changes the earlier windows as well.
+        """
+        tail = self.tail
+        sn = numpy.concatenate((readings.sn[tail], new.sn))
+        stamps = numpy.concatenate((readings.stamps[tail], new.stamps))
+        order = numpy.lexsort((stamps, sn))
+        fresh = order >= len(tail)
+        sn, stamps = sn[order], stamps[order]
+        if (fresh[:-1] & ~fresh[1:] & (sn[1:] == sn[:-1])).any():
+            return None
+        temps = numpy.concatenate((readings.temps[tail], new.temps))[order]
+        high = numpy.concatenate((readings.high[tail], new.high))[order]
+        low = numpy.concatenate((readings.low[tail], new.low))[order]
+        update = {"rows": len(readings)}
+        if len(order):
+            rows = order[fresh] - len(tail)
+            for name, values in zip(("mean", "std", "above", "below"),
+                                    Rolling(stamps, temps, high, low, sn, self.window)):
+                update[name] = numpy.empty(len(new), dtype=values.dtype)
+                update[name][rows] = values[fresh]
+            last = numpy.append(numpy.flatnonzero(sn[1:] != sn[:-1]), len(sn) - 1)
+            numbers = numpy.concatenate((tail, numpy.arange(len(readings), len(readings) + len(new))))[order]
+            update["tail"] = numbers[stamps > numpy.repeat(stamps[last], numpy.diff(numpy.append(-1, last))) -
+                                     self.window]
+        else:
+            update.update(mean=numpy.zeros(0), std=numpy.zeros(0), above=self.above[:0], below=self.below[:0],
+                          tail=tail)
+        ended, update["running"] = ContinueRuns(sn[fresh], stamps[fresh], temps[fresh], high[fresh], low[fresh],
+                                                self.running)
+        update["excursions"] = {name: numpy.array([run[number] for run in ended], dtype=self.excursions[name].dtype)
+                                for number, name in enumerate(self.FIELDS)}
+        return update
+
+    def Extend(self, update):
+        """
+        Add the statistics Prepare worked out for appended readings
+        """
+        for name in ("mean", "std", "above", "below"):
+            setattr(self, name, Grow(self.buffers, name, getattr(self, name), update[name]))
+        self.excursions = {name: Grow(self.buffers, name, values, update["excursions"][name])
+                           for name, values in self.excursions.items()}
+        self.running, self.tail = update["running"], update["tail"]
+
+    def Excursions(self):
+        """
+        Rows of SN, start, end, duration, readings and peak temperature, longest first
+        """
+        running = [(code,) + run for code, run in sorted(self.running.items())]
+        excursions = {}
+        for number, name in enumerate(self.FIELDS):
+            values = self.excursions[name]
+            excursions[name] = numpy.append(values, numpy.array([run[number] for run in running], dtype=values.dtype))
+        order = numpy.lexsort((excursions["start"], excursions["serial"], excursions["start"] - excursions["end"]))
+        return [(self.snTable[serial], FormatStamp(start), FormatStamp(end), timedelta(seconds=end - start), rows,
+                 peak)
+                for serial, start, end, rows, peak in zip(*[excursions[name][order].tolist() for name in
+                                                            ("serial", "start", "end", "rows", "peak")])]
+
+
+def FormatStamp(stamp):
+    return numpy.datetime64(int(stamp), 's').item().strftime("%m-%d-%Y %I:%M:%S %p")
+
+
+def Decimate(x, y, target):
+    """
+    Largest-Triangle-Three-Buckets downsampling, returns the indices of at most target points
+    of y(x) that keep the shape of the series. x must be sorted.
+    """
+    count = len(x)
+    if target >= count or target < 3:
+        return numpy.arange(count)
+    x = numpy.asarray(x, dtype=numpy.float64)
+    y = numpy.asarray(y, dtype=numpy.float64)
+    edges = numpy.linspace(1, count - 1, target - 1).astype(numpy.int64)
+    keep = numpy.empty(target, dtype=numpy.int64)
+    keep[0], keep[-1] = 0, count - 1
+    selected = 0
+    for bucket in range(target - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        nextStop = edges[bucket + 2] if bucket + 2 < len(edges) else count
+        averageX = x[stop:nextStop].mean()
+        averageY = y[stop:nextStop].mean()
+        area = numpy.abs((x[selected] - averageX) * (y[start:stop] - y[selected]) -
+                         (x[selected] - x[start:stop]) * (averageY - y[selected]))
+        selected = start + int(area.argmax())
+        keep[bucket + 1] = selected
+    return keep
+
+
+def DecimateReadings(readings, target=PLOT_POINTS):
+    """
+    Rows to plot: an LTTB sample of each instrument's series in time order, sharing the target
+    in proportion to their readings, plus every out-of-limit reading
+    """
+    if len(readings) <= target:
+        return numpy.arange(len(readings))
+    index = readings.BySerial()
+    order = index.Order()
+    samples = [numpy.flatnonzero(readings.OutOfLimit())]
+    for start, stop in zip(index.starts.tolist(), index.stops.tolist()):
+        rows = order[start:stop]
+        share = max(3, target * (stop - start) // len(readings))
+        samples.append(rows[Decimate(readings.stamps[rows], readings.temps[rows], share)])
+    return numpy.unique(numpy.concatenate(samples))
+
+
+def Runs(mask, breaks=None):
+    """
+    Start and stop positions of the runs of True in mask; a run also ends before each
+    position in breaks, so runs never span two groups
+    """
+    edges = numpy.diff(numpy.concatenate(([0], mask.view(numpy.int8), [0])))
+    starts, stops = numpy.flatnonzero(edges == 1), numpy.flatnonzero(edges == -1)
+    if breaks is not None and len(breaks) and len(starts):
+        # split runs at group boundaries that fall strictly inside them
+        inside = breaks[mask[numpy.maximum(breaks - 1, 0)] & mask[breaks] & (breaks > 0)]
+        starts = numpy.sort(numpy.concatenate((starts, inside)))
+        stops = numpy.sort(numpy.concatenate((stops, inside)))
+    return starts, stops
+
+
+def Peaks(excess, mask, starts):
+    """
+    Position of the largest excess in each run of mask beginning at starts, the latest on a tie
+    """
+    rows = numpy.flatnonzero(mask)
+    run = numpy.searchsorted(starts, rows, side="right") - 1
+    # sorted by run then excess, the last row of each run is its peak
+    ranking = numpy.lexsort((excess[rows], run))
+    return rows[ranking][numpy.append(numpy.flatnonzero(numpy.diff(run[ranking])), len(rows) - 1)]
+
+
+def Rolling(stamps, temps, high, low, group, window):
+    """
+    Mean, standard deviation and seconds above and below the limits over the trailing window of
+    each reading, for readings sorted by group (instrument) then time
+    """
+    count = len(stamps)
+    # group and time packed into one sorted key, so a single searchsorted finds every window start
+    key = group.astype(numpy.int64) * (1 << 40) + (stamps - stamps.min())
+    first = numpy.searchsorted(key, key - window, side="right")
+    position = numpy.arange(count)
+    size = position + 1 - first
+
+    # centring on the overall mean keeps the squared prefix sums from losing precision
+    centred = temps - temps.mean()
+    sums = numpy.concatenate(([0.0], numpy.cumsum(centred)))
+    squares = numpy.concatenate(([0.0], numpy.cumsum(centred * centred)))
+    windowSum = sums[position + 1] - sums[first]
+    windowMean = windowSum / size
+    mean = windowMean + temps.mean()
+    std = numpy.sqrt(numpy.maximum((squares[position + 1] - squares[first]) / size - windowMean ** 2, 0))
+    std[size == 1] = 0
+
+    # each reading holds until the instrument's next one; the time out of limit is the share of
+    # those intervals inside the window
+    held = numpy.zeros(count, dtype=numpy.int64)
+    held[:-1] = stamps[1:] - stamps[:-1]
+    held[:-1][group[1:] != group[:-1]] = 0
+    above = numpy.concatenate(([0], numpy.cumsum(held * (temps > high))))
+    below = numpy.concatenate(([0], numpy.cumsum(held * (temps < low))))
+    return mean, std, above[position] - above[first], below[position] - below[first]
+
+
+def ContinueRuns(codes, stamps, temps, high, low, running):
+    """
+    Excursions in appended readings sorted by SN code and time, joined onto the ones running
+    at each instrument's latest earlier reading. running maps an SN code to its running
+    excursion as (start, end, rows, peak, excess). Returns the excursions that ended, as
+    (code, start, end, rows, peak, excess), and the ones still running after the new readings.
+    """
+    running = dict(running)
+    ended = []
+    if not len(codes):
+        return ended, running
+    bad = (temps > high) | (temps < low)
+    excess = numpy.maximum(temps - high, low - temps)
+    starts = numpy.flatnonzero(numpy.concatenate(([True], codes[1:] != codes[:-1])))
+    stops = numpy.append(starts[1:], len(codes))
+    # a running excursion ends at its instrument's first appended reading back within limits
+    for code in codes[starts[~bad[starts]]].tolist():
+        if code in running:
+            ended.append((code,) + running.pop(code))
+    runStarts, runStops = Runs(bad, starts)
+    last = runStops == stops[numpy.searchsorted(starts, runStarts, side="right") - 1]
+    for start, stop, latest in zip(runStarts.tolist(), runStops.tolist(), last.tolist()):
+        code = int(codes[start])
+        peak = stop - 1 - int(excess[start:stop][::-1].argmax())
+        run = (int(stamps[start]), int(stamps[stop - 1]), stop - start, float(temps[peak]), float(excess[peak]))
+        if code in running:
+            # still out of limit at the first appended reading, so this carries on the running one
+            earlier = running.pop(code)
+            run = (earlier[0], run[1], earlier[2] + run[2]) + (run[3:] if run[4] >= earlier[4] else earlier[3:])
+        if latest:
+            running[code] = run
+        else:
+            ended.append((code,) + run)
+    return ended, running
+
+
+class SerialIndex(object):
+    """
+    Rows of each instrument (SN) in time order, with per-instrument statistics.
+    Order() sorts the readings by SN then time, and rows Order()[starts[i]:stops[i]] belong to
+    serial snTable[codes[i]]. The statistics are computed in one vectorized pass over the
+    sorted columns. Extend updates them for appended readings, whose rows are merged into the
+    order only when it is next asked for.
+    """
+    def __init__(self, readings):
+        self.readings = readings
+        self.order = numpy.lexsort((readings.stamps, readings.sn))
+        # rows appended since order was sorted
+        self.pending = []
+        sn = readings.sn[self.order]
+        self.starts = numpy.flatnonzero(numpy.concatenate(([True], sn[1:] != sn[:-1]))[:len(sn)])
+        self.stops = numpy.append(self.starts[1:], len(sn)).astype(self.starts.dtype)
+        self.codes = sn[self.starts]
+        self.counts = self.stops - self.starts
+        # excursions still running at each instrument's latest reading, as in Analytics
+        self.running = {}
+        if not len(sn):
+            self.low = self.high = self.mean = self.total = numpy.zeros(0)
+            self.last = self.outOfLimit = self.endedRows = self.endedSeconds = self.endedStart = \
+                numpy.zeros(0, dtype=numpy.int64)
+            self.Longest()
+            return
+
+        temps = readings.temps[self.order]
+        stamps = readings.stamps[self.order]
+        self.low = numpy.minimum.reduceat(temps, self.starts)
+        self.high = numpy.maximum.reduceat(temps, self.starts)
+        self.total = numpy.add.reduceat(temps, self.starts)
+        self.mean = self.total / self.counts
+        self.last = stamps[self.stops - 1]
+        bad = readings.OutOfLimit()[self.order]
+        self.outOfLimit = numpy.add.reduceat(bad.astype(numpy.int64), self.starts)
+
+        # longest excursion: the run of consecutive out-of-limit readings lasting longest; runs
+        # reaching an instrument's latest reading are kept apart, as appended readings may extend them
+        runStarts, runStops = Runs(bad, self.starts)
+        groups = numpy.searchsorted(self.starts, runStarts, side="right") - 1
+        running = runStops == self.stops[groups]
+        if running.any():
+            high = readings.high[self.order]
+            low = readings.low[self.order]
+            excess = numpy.maximum(temps - high, low - temps)
+            peaks = Peaks(excess, bad, runStarts)[running]
+            for code, start, end, rows, peak, over in zip(
+                    self.codes[groups[running]].tolist(), stamps[runStarts[running]].tolist(),
+                    stamps[runStops[running] - 1].tolist(), (runStops - runStarts)[running].tolist(),
+                    temps[peaks].tolist(), excess[peaks].tolist()):
+                self.running[code] = (start, end, rows, peak, over)
+        groups, runStarts, runStops = groups[~running], runStarts[~running], runStops[~running]
+        seconds = stamps[runStops - 1] - stamps[runStarts]
+        rows = runStops - runStarts
+        longest = numpy.lexsort((rows, seconds, groups))
+        ends = numpy.ones(len(longest), dtype=bool)
+        ends[:-1] = groups[longest][1:] != groups[longest][:-1]
+        last = longest[ends]
+        self.endedRows = numpy.zeros(len(self.starts), dtype=numpy.int64)
+        self.endedSeconds = numpy.zeros(len(self.starts), dtype=numpy.int64)
+        self.endedStart = numpy.zeros(len(self.starts), dtype=numpy.int64)
+        self.endedRows[groups[last]] = rows[last]
+        self.endedSeconds[groups[last]] = seconds[last]
+        self.endedStart[groups[last]] = stamps[runStarts[last]]
+        self.Longest()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def Order(self):
+        """
+        Row order sorting the readings by SN then time, merging in the appended rows first
+        """
+        if self.pending:
+            readings = self.readings
+            rows = numpy.concatenate(self.pending)
+            rows = rows[numpy.lexsort((readings.stamps[rows], readings.sn[rows]))]
+            # appended rows follow the earlier ones of their serial, so they go at the end of its rows
+            self.order = numpy.insert(self.order, numpy.searchsorted(readings.sn[self.order], readings.sn[rows],
+                                                                     side="right"), rows)
+            self.pending = []
+        return self.order
+
+    def Extend(self, first):
+        """
+        Add the readings appended from row first onwards. False when one goes back before the
+        latest reading of its instrument, and the index has to be rebuilt instead.
+        """
+        readings = self.readings
+        rows = numpy.arange(first, len(readings))
+        if not len(rows):
+            return True
+        rows = rows[numpy.lexsort((readings.stamps[rows], readings.sn[rows]))]
+        sn = readings.sn[rows]
+        stamps = readings.stamps[rows]
+        temps = readings.temps[rows]
+        starts = numpy.flatnonzero(numpy.concatenate(([True], sn[1:] != sn[:-1])))
+        codes = sn[starts]
+        position = numpy.searchsorted(self.codes, codes)
+        known = position < len(self.codes)
+        known[known] = self.codes[position[known]] == codes[known]
+        if (stamps[starts[known]] < self.last[position[known]]).any():
+            return False
+
+        # new instruments get empty entries; insert copies, so nothing read elsewhere changes
+        at = position[~known]
+        self.codes = numpy.insert(self.codes, at, codes[~known])
+        self.counts = numpy.insert(self.counts, at, 0)
+        self.low = numpy.insert(self.low, at, numpy.inf)
+        self.high = numpy.insert(self.high, at, -numpy.inf)
+        self.total = numpy.insert(self.total, at, 0)
+        self.last = numpy.insert(self.last, at, 0)
+        self.outOfLimit = numpy.insert(self.outOfLimit, at, 0)
+        self.endedRows = numpy.insert(self.endedRows, at, 0)
+        self.endedSeconds = numpy.insert(self.endedSeconds, at, 0)
+        self.endedStart = numpy.insert(self.endedStart, at, 0)
+
+        position = numpy.searchsorted(self.codes, codes)
+        stops = numpy.append(starts[1:], len(sn))
+        self.counts[position] += stops - starts
+        self.low[position] = numpy.minimum(self.low[position], numpy.minimum.reduceat(temps, starts))
+        self.high[position] = numpy.maximum(self.high[position], numpy.maximum.reduceat(temps, starts))
+        self.total[position] += numpy.add.reduceat(temps, starts)
+        self.mean = self.total / self.counts
+        self.last[position] = stamps[stops - 1]
+        self.outOfLimit[position] += numpy.add.reduceat(readings.OutOfLimit()[rows].astype(numpy.int64), starts)
+        self.stops = numpy.cumsum(self.counts)
+        self.starts = self.stops - self.counts
+        self.pending = self.pending + [rows]
+
+        ended, self.running = ContinueRuns(sn, stamps, temps, readings.high[rows], readings.low[rows], self.running)
+        for code, start, end, count, peak, excess in ended:
+            number = int(numpy.searchsorted(self.codes, code))
+            if (end - start, count) >= (self.endedSeconds[number], self.endedRows[number]):
+                self.endedRows[number], self.endedSeconds[number], self.endedStart[number] = count, end - start, start
+        self.Longest()
+        return True
+
+    def Longest(self):
+        """
+        Longest excursion of each serial, the running one taking a tie since it is the latest
+        """
+        self.excursionRows = self.endedRows.copy()
+        self.excursionSeconds = self.endedSeconds.copy()
+        self.excursionStart = self.endedStart.copy()
+        for code, (start, end, rows, peak, excess) in self.running.items():
+            number = int(numpy.searchsorted(self.codes, code))
+            if (end - start, rows) >= (self.excursionSeconds[number], self.excursionRows[number]):
+                self.excursionRows[number], self.excursionSeconds[number], self.excursionStart[number] = \
+                    rows, end - start, start
+
+    def Serials(self):
+        return [self.readings.snTable[code] for code in self.codes.tolist()]
+
+    def Rows(self, serial):
+        """
+        Row numbers of one serial's readings in time order
+        """
+        code = self.readings.snCodes.get(serial)
+        position = numpy.flatnonzero(self.codes == code)
+        if code is None or not len(position):
+            return numpy.zeros(0, dtype=self.order.dtype)
+        return self.Order()[self.starts[position[0]]:self.stops[position[0]]]
+
+    def Excursion(self, position):
+        """
+        Longest excursion of the serial at position, as text for the tables
+        """
+        rows = int(self.excursionRows[position])
+        if not rows:
+            return "-"
+        return "{0} ({1} readings, {2})".format(FormatStamp(self.excursionStart[position]), rows,
+                                               timedelta(seconds=int(self.excursionSeconds[position])))
+
+    def Summary(self):
+        """
+        Summary rows of SN, readings, min, max, mean, out-of-limit count and longest excursion
+        """
+        return [(serial, count, low, high, round(mean, 2), bad, self.Excursion(position))
+                for position, (serial, count, low, high, mean, bad) in enumerate(zip(
+                    self.Serials(), self.counts.tolist(), self.low.tolist(), self.high.tolist(),
+                    self.mean.tolist(), self.outOfLimit.tolist()))]
+
+
+class ReadingCache(object):
+    """
+    On-disk cache of parsed reading files stored as raw column buffers.
+    Entries are keyed by source path, mtime, size and content hash, loaded back through
+    mmap and evicted least recently used once the directory grows past maxBytes.
+    """
+    MAGIC = b"RCTTCOL1"
+    COLUMNS = (("stamps", "<i8"), ("temps", "<f8"), ("high", "<f8"), ("low", "<f8"), ("status", "<u2"), ("sn", "<u2"))
+
+    def __init__(self, directory=CACHE_DIR, maxBytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def Key(self, path):
+        stat = os.stat(path)
+        digest = hashlib.sha1()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(block)
+        source = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+        version = "{0}:{1}:{2}".format(stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+        return source, hashlib.sha1(version.encode("utf-8")).hexdigest()[:16]
+
+    def Entry(self, key):
+        return os.path.join(self.directory, "{0}-{1}.rcol".format(*key))
+
+    def Get(self, key):
+        entry = self.Entry(key)
+        if not os.path.isfile(entry):
+            return None
+        try:
+            with open(entry, 'rb') as file:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            if buffer[:len(self.MAGIC)] != self.MAGIC:
+                raise ValueError("bad cache header")
+            size = int(numpy.frombuffer(buffer, dtype="<u8", count=1, offset=len(self.MAGIC))[0])
+            start = len(self.MAGIC) + 8
+            header = json.loads(buffer[start:start + size].decode("utf-8"))
+            readings = Readings()
+            for name, dtype in self.COLUMNS:
+                setattr(readings, name, numpy.frombuffer(buffer, dtype=dtype, count=header["rows"],
+                                                         offset=header["offsets"][name]))
+            readings.statusTable = header["statusTable"]
+            readings.snTable = header["snTable"]
+            readings.statusCodes = {value: code for code, value in enumerate(readings.statusTable)}
+            readings.snCodes = {value: code for code, value in enumerate(readings.snTable)}
+            readings.offset = header.get("offset")
+            readings.fingerprint = header.get("fingerprint")
+            readings.sortedByTime = header.get("sortedByTime")
+            if "timeOrder" in header["offsets"]:
+                readings.timeOrder = numpy.frombuffer(buffer, dtype="<i8", count=header["rows"],
+                                                      offset=header["offsets"]["timeOrder"])
+        except Exception as ex:
+            logging.warning("Discarding unreadable cache entry {0}: {1}".format(entry, ex))
+            self.Remove(entry)
+            return None
+        os.utime(entry)
+        logging.debug("Loaded {0} readings from cache {1}".format(header["rows"], entry))
+        return readings
+
+    def Put(self, key, readings):
+        if not readings:
+            return
+        entry = self.Entry(key)
+        for name in os.listdir(self.directory):
+            if name.startswith(key[0] + "-"):
+                self.Remove(os.path.join(self.directory, name))
+
+        # persist the time order too, so range queries on unsorted files skip the sort next time
+        columns = self.COLUMNS if readings.TimeOrder() is None else self.COLUMNS + (("timeOrder", "<i8"),)
+        offsets = {name: 0 for name, _ in columns}
+        header = {"rows": len(readings), "offsets": offsets,
+                  "statusTable": readings.statusTable, "snTable": readings.snTable,
+                  "offset": readings.offset, "fingerprint": readings.fingerprint,
+                  "sortedByTime": readings.sortedByTime}
+        # offsets depend on the header length, so size the header with room for each offset first
+        size = len(json.dumps(header)) + 20 * len(columns)
+        offset = len(self.MAGIC) + 8 + size
+        for name, dtype in columns:
+            offset += -offset % 8
+            offsets[name] = offset
+            offset += len(readings) * numpy.dtype(dtype).itemsize
+        encoded = json.dumps(header).encode("utf-8").ljust(size)
+
+        temp = entry + ".tmp"
+        with open(temp, 'wb') as file:
+            file.write(self.MAGIC)
+            file.write(numpy.array([size], dtype="<u8").tobytes())
+            file.write(encoded)
+            for name, dtype in columns:
+                file.write(b"\0" * (offsets[name] - file.tell()))
+                file.write(numpy.ascontiguousarray(getattr(readings, name), dtype=dtype).tobytes())
+        os.replace(temp, entry)
+        logging.debug("Cached {0} readings in {1}".format(len(readings), entry))
+        self.Evict()
+
+    def Evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".rcol"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(self.directory, name)))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        # never evict the newest entry, even if it alone is over the limit
+        for _, size, entry in entries[:-1]:
+            if total <= self.maxBytes:
+                break
+            if self.Remove(entry):
+                total -= size
+
+    def Remove(self, entry):
+        try:
+            os.remove(entry)
+            return True
+        except OSError as ex:
+            logging.warning("Could not remove cache entry {0}: {1}".format(entry, ex))
+            return False
+
+
+def PlotColumns(readings):
+    """
+    Columns of the plot data source, shared by the saved plot and the watch mode updates
+    """
+    return {
+        'Day': readings.Datetimes(),  # datetime64 column as X axis
+        'Temp': readings.temps,
+        'Day_str': readings.Days(),  # string of datetime for display in tooltip
+        'High': readings.high,
+        'Low': readings.low,
+        'Status': readings.Status(),
+        'SN': readings.SN()}
+
+
+def BuildPlot(readings, maxPoints=PLOT_POINTS, window=ROLLING_WINDOW):
+    """
+    Bokeh figures for all readings, with each instrument's rolling mean, and for the out-of-limit readings
+    """
+    degree = u"\u00b0"
+    # upper = [high[0]] * len(days)
+    # lower = [low[0]] * len(days)
+
+    shown = DecimateReadings(readings, maxPoints)
+    plotted = readings.Take(shown)
+    rollingMean = readings.Analyze(window).mean[shown]
+    title = "All Temperature Readings"
+    if len(plotted) < len(readings):
+        title = "All Temperature Readings ({0} of {1} shown)".format(len(plotted), len(readings))
+        logging.debug("Decimated plot from {0} to {1} points".format(len(readings), len(plotted)))
+    # Bokeh needs at least two minor ticks, even for a single reading
+    ticks = max(2, min(len(plotted), PLOT_TICKS))
+
+    tools = ["box_select", "hover", "reset"]
+    # create a new plot
+    p = figure(plot_height=700, plot_width=1000, tools=tools, x_axis_label='Days', x_minor_ticks=ticks,
+               y_axis_label='Temperature ({0}C)'.format(degree), x_axis_type="datetime", toolbar_location="right",
+               title=title)
+    p_filtered = figure(plot_height=700, plot_width=1000, tools=tools, x_axis_label='Days',
+                        x_minor_ticks=ticks,
+                        y_axis_label='Temperature ({0}C)'.format(degree), x_axis_type="datetime",
+                        toolbar_location="right",
+                        title="Out of Limit Temperature Readings")
+
+    # named so a live view can stream appended readings into the page
+    source = ColumnDataSource(name="readings", data=PlotColumns(plotted))
+
+
+    # p.line(days, upper, legend="Upper Limit", line_width=3)
+    # p.line(days, lower, legend="Lower Limit", line_width=3)
+    filter_points = numpy.flatnonzero(plotted.OutOfLimit()).tolist()
+    view = CDSView(name="outOfLimitView", source=source, filters=[IndexFilter(filter_points, name="outOfLimit")])
+    p_filtered.circle('Day', 'Temp', source=source, legend="Readings", line_width=3, hover_color="green", alpha=0.4,
+                      size=11, view=view)
+    # p.annulus(x=days, y=temps, color="#7FC97F",
+    #              inner_radius=0.2, outer_radius=0.5)
+
+    p_filtered.title.align = "center"
+    p_filtered.title.text_color = "navy"
+    p_filtered.title.text_font_size = "20px"
+    p_filtered.title.text_font_style = "bold"
+    p_filtered.xaxis[0].ticker.desired_num_ticks = ticks
+    p_filtered.legend.visible = False
+    p_filtered.select_one(HoverTool).tooltips = [
+        ('Date', '@Day_str'),
+        ('Temp', '@Temp'),
+        ('High', '@High'),
+        ('Low', '@Low'),
+        ('Status', '@Status'),
+        ('SN', '@SN')
+    ]
+
+    # one series per instrument; the SN filters also pick up readings streamed in later
+    index = plotted.BySerial()
+    order = index.Order()
+    serials = index.Serials()
+    palette = Category10[10] if len(serials) <= 10 else Category20[20]
+    for number, serial in enumerate(serials):
+        color = palette[number % len(palette)]
+        series = CDSView(source=source, filters=[GroupFilter(column_name='SN', group=serial)])
+        p.circle('Day', 'Temp', source=source, legend=serial, color=color, line_width=3,
+                 hover_color="green", alpha=0.4, size=11, view=series)
+        rows = order[index.starts[number]:index.stops[number]]
+        p.line(plotted.Datetimes()[rows], rollingMean[rows], legend=serial, color=color, line_width=2)
+    # p.annulus(x=days, y=temps, color="#7FC97F",
+    #              inner_radius=0.2, outer_radius=0.5)
+
+    p.title.align = "center"
+    p.title.text_color = "navy"
+    p.title.text_font_size = "20px"
+    p.title.text_font_style = "bold"
+    p.xaxis[0].ticker.desired_num_ticks = ticks
+    p.legend.visible = 1 < len(serials) <= LEGEND_SERIALS
+    p.legend.location = "top_left"
+    p.legend.click_policy = "hide"
+    p.select_one(HoverTool).tooltips = [
+        ('Date', '@Day_str'),
+        ('Temp', '@Temp'),
+        ('High', '@High'),
+        ('Low', '@Low'),
+        ('Status', '@Status'),
+        ('SN', '@SN')
+    ]
+
+    return p, p_filtered, filter_points
+
+
+def OpenOutput(path, compress=False):
+    """
+    Text file for an output page, written gzip compressed to path.gz when compress is set
+    """
+    if compress:
+        return gzip.open(path + ".gz", 'wt', encoding="utf-8", compresslevel=6)
+    return open(path, 'w', buffering=1024 * 1024, encoding="utf-8")
+
+
+def OutputName(path, compress=False):
+    return path + ".gz" if compress else path
+
+
+def Compact(text):
+    """
+    Markup without the indentation between tags
+    """
+    return re.sub(r">\s+<", "><", text).strip()
+
+
+def StaticAsset(static, name, source=None, text=None):
+    """
+    Path of a shared asset under the static folder, copied from source or written from text
+    the first time it is asked for. Written through a temporary file, so batch workers racing
+    for the same asset never see it half written.
+    """
+    path = os.path.join(static, name)
+    if not os.path.isfile(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = "{0}.{1}.tmp".format(path, os.getpid())
+        if source is not None:
+            with open(source, 'rb') as file:
+                data = file.read()
+        else:
+            data = text.encode("utf-8")
+        with open(temp, 'wb') as file:
+            file.write(data)
+        os.replace(temp, path)
+        logging.debug("Wrote shared asset {0}".format(path))
+    return path
+
+
+def StaticLink(page, asset):
+    """
+    URL of an asset relative to the page linking it
+    """
+    return os.path.relpath(asset, os.path.dirname(os.path.abspath(page))).replace(os.sep, "/")
+
+
+def StyleSheet():
+    """
+    The table CSS of HTML_STYLE as a stylesheet
+    """
+    return re.sub(r"\s+", " ", HTML_STYLE.split("<style>")[1].split("</style>")[0]).strip() + " tr.r{color: red;}"
+
+
+def WritePlot(readings, path, maxPoints=PLOT_POINTS, window=ROLLING_WINDOW, static=None, compress=False):
+    """
+    Save the readings plot as an HTML file and return the main figure. The page is standalone
+    unless static names the folder of shared assets, in which case BokehJS is copied there
+    once and linked instead of being inlined into every page.
+    """
+    p, p_filtered, filter_points = BuildPlot(readings, maxPoints, window)
+    layout = column(p, p_filtered) if filter_points else column(p)
+    if static is None and not compress:
+        # passing the file settings to save() keeps it off Bokeh's global state, so stages can run in threads
+        save(layout, filename=path, resources=CDN, title="Temperature Readings")
+        return p
+    if static is None:
+        page = file_html(layout, INLINE, "Temperature Readings")
+    else:
+        # a semi-internal Bokeh helper, so only needed (and imported) when pages link shared assets
+        from bokeh.embed.bundle import bundle_for_objs_and_resources
+
+        bundle = bundle_for_objs_and_resources([layout], Resources(mode="absolute"))
+        scripts = ['<script src="{0}"></script>'.format(StaticLink(path, StaticAsset(
+            static, "bokeh-{0}/{1}".format(BOKEH_VERSION, os.path.basename(source)), source)))
+            for source in bundle.js_files]
+        scripts += ["<script>{0}</script>".format(text) for text in bundle.js_raw]
+        script, div = components(layout)
+        page = PLOT_PAGE.format("Temperature Readings", "".join(scripts), div, script.strip())
+    with OpenOutput(path, compress) as html:
+        html.write(page)
+    return p
+
+
+class PlotServer(object):
+    """
+    In-process Bokeh server for the readings plot. Each page load builds a document from the
+    current readings, and appended readings are streamed to the open pages.
+    The pages are built on the server thread from snapshots, so the caller can go on
+    extending its readings.
+    """
+    def __init__(self, port=0, maxPoints=PLOT_POINTS):
+        self.port = port
+        self.maxPoints = maxPoints
+        self.readings = None
+        # counts Show calls, so a page built from an earlier file is not sent this one's rows
+        self.shown = 0
+        self.documents = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    def Start(self):
+        from bokeh.server.server import Server
+        from tornado.ioloop import IOLoop
+
+        if not self.port:
+            with socket.socket() as probe:
+                probe.bind(("localhost", 0))
+                self.port = probe.getsockname()[1]
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            loop = IOLoop.current()
+            self.server = Server({"/plot": self.Document}, io_loop=loop, port=self.port,
+                                 allow_websocket_origin=["localhost:{0}".format(self.port),
+                                                         "127.0.0.1:{0}".format(self.port)])
+            self.server.start()
+            started.set()
+            loop.start()
+
+        self.thread = threading.Thread(target=run, name="PlotServer", daemon=True)
+        self.thread.start()
+        started.wait()
+        logging.debug("Plot server listening on {0}".format(self.Url()))
+        return self
+
+    def Url(self):
+        return "http://localhost:{0}/plot".format(self.port)
+
+    def Show(self, readings):
+        """
+        Serve readings to pages loaded from now on. The statistics the plot needs are computed
+        here first, so every snapshot shares them.
+        """
+        readings.Analyze()
+        readings.BySerial()
+        with self.lock:
+            self.readings = readings.Snapshot()
+            self.shown += 1
+
+    def Document(self, doc):
+        with self.lock:
+            readings, shown = self.readings, self.shown
+        doc.title = "Temperature Readings"
+        if readings is None or not readings:
+            return
+        p, p_filtered, filter_points = BuildPlot(readings, self.maxPoints)
+        doc.add_root(column(p, p_filtered))
+        with self.lock:
+            # rows streamed while the page was being built are sent to it now
+            if shown == self.shown and len(self.readings) > len(readings):
+                doc.add_next_tick_callback(partial(self.Append, doc,
+                                                   self.readings.Take(slice(len(readings), len(self.readings)))))
+            self.documents.append(doc)
+        doc.on_session_destroyed(lambda context: self.Forget(doc))
+
+    def Forget(self, doc):
+        with self.lock:
+            if doc in self.documents:
+                self.documents.remove(doc)
+
+    def Stream(self, readings, new):
+        """
+        Append new, the rows just added to readings, to the plots of every open page, and serve
+        readings to pages loaded from now on
+        """
+        if not new:
+            return
+        with self.lock:
+            self.readings = readings.Snapshot()
+            documents = list(self.documents)
+        for doc in documents:
+            doc.add_next_tick_callback(partial(self.Append, doc, new))
+
+    @staticmethod
+    def Append(doc, readings):
+        source = doc.get_model_by_name("readings")
+        start = len(source.data["Day"])
+        source.stream(PlotColumns(readings))
+        outOfLimit = doc.get_model_by_name("outOfLimit")
+        outOfLimit.indices = list(outOfLimit.indices) + (numpy.flatnonzero(readings.OutOfLimit()) + start).tolist()
+        doc.get_model_by_name("outOfLimitView").filters = [outOfLimit]
+
+    def Stop(self):
+        if self.server is not None:
+            self.server.io_loop.add_callback(self.server.stop)
+            self.server.io_loop.add_callback(self.server.io_loop.stop)
+            self.thread.join(5)
+            self.server = None
+
+
+def WriteImage(figure, path):
+    export_png(figure, filename=path)
+    return path
+
+
+class ImageRenderer(object):
+    """
+    Draws the plot images with matplotlib's Agg backend instead of a headless browser.
+    The figures and drawing threads are kept between calls, so later exports start warm.
+    """
+    shared = None
+
+    def __init__(self):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.figures = [Figure(figsize=(10, 7), dpi=100) for _ in range(2)]
+        for image in self.figures:
+            FigureCanvasAgg(image)
+        self.pool = ThreadPoolExecutor(max_workers=len(self.figures))
+        self.lock = threading.Lock()
+
+    @classmethod
+    def Shared(cls):
+        """
+        The renderer of this process, created on first use
+        """
+        if cls.shared is None:
+            cls.shared = cls()
+        return cls.shared
+
+    @staticmethod
+    def Draw(image, title, series, path):
+        """
+        Scatter plot with one (label, days, temps) series per instrument
+        """
+        image.clear()
+        axes = image.add_subplot(1, 1, 1)
+        for label, days, temps in series:
+            axes.scatter(days, temps, s=60, alpha=0.4, linewidths=0, label=label)
+        if 1 < len(series) <= LEGEND_SERIALS:
+            axes.legend(loc="upper left", fontsize="small")
+        axes.set_title(title, color="navy", fontsize=15, fontweight="bold")
+        axes.set_xlabel("Days")
+        axes.set_ylabel(u"Temperature (\u00b0C)")
+        axes.grid(True, color="#e5e5e5")
+        image.autofmt_xdate()
+        image.savefig(path)
+        return path
+
+    def Render(self, readings, path, filteredPath=None, maxPoints=PLOT_POINTS):
+        """
+        Write the plot of all readings to path and, when any are out of limit, the plot of
+        those to filteredPath, drawing both at once. Returns the written paths.
+        """
+        plotted = readings.Take(DecimateReadings(readings, maxPoints))
+        days = plotted.Datetimes()
+        outOfLimit = plotted.OutOfLimit()
+        index = plotted.BySerial()
+        series = [(serial, days[rows], plotted.temps[rows])
+                  for serial, rows in zip(index.Serials(), numpy.split(index.Order(), index.starts[1:]))]
+        with self.lock:
+            jobs = [self.pool.submit(self.Draw, self.figures[0], "All Temperature Readings", series, path)]
+            if filteredPath and outOfLimit.any():
+                jobs.append(self.pool.submit(self.Draw, self.figures[1], "Out of Limit Temperature Readings",
+                                             [(None, days[outOfLimit], plotted.temps[outOfLimit])], filteredPath))
+            return [job.result() for job in jobs]
+
+
+def WriteImages(readings, path, filteredPath=None, maxPoints=PLOT_POINTS, figure=None):
+    """
+    Plot images for the PDF report, from matplotlib when it is installed and otherwise
+    exported from the Bokeh figure
+    """
+    try:
+        return ImageRenderer.Shared().Render(readings, path, filteredPath, maxPoints)
+    except ImportError as ex:
+        logging.warning("matplotlib unavailable, exporting images through Bokeh: {0}".format(ex))
+    if figure is None:
+        figure = BuildPlot(readings, maxPoints)[0]
+    return [WriteImage(figure, path)]
+
+
+def WriteTable(readings, path, chunkRows=4096, window=ROLLING_WINDOW, static=None, compress=False):
+    """
+    Stream the readings table to an HTML file a chunk of rows at a time, after the per-SN
+    summary and the list of excursions. With static the page links the shared stylesheet
+    and drops the indentation of the markup. Returns the path written.
+    """
+    outOfLimit = readings.OutOfLimit()
+    markup = (lambda text: text) if static is None else Compact
+    with OpenOutput(path, compress) as html:
+        if static is None:
+            html.write(HTML_STYLE)
+        else:
+            html.write(HTML_LINKED_STYLE.format(StaticLink(path, StaticAsset(static, REPORT_CSS, text=StyleSheet()))))
+        html.write(markup(SummaryTable(readings)))
+        excursions = readings.Analyze(window).Excursions()
+        if excursions:
+            html.write(markup(HTML_EXCURSION_HEAD))
+            html.write("".join([HTML_EXCURSION_ROW.format(*[escape(str(value)) for value in row])
+                                for row in excursions]))
+            html.write(HTML_SUMMARY_END)
+        html.write(HTML_WINDOW.format(timedelta(seconds=window)))
+        html.write(markup(HTML_READINGS_HEAD))
+        for start in range(0, len(readings), chunkRows):
+            html.write(TableRows(readings, start, start + chunkRows, outOfLimit, window, static is not None))
+        html.write(HTML_TABLE_END)
+    return OutputName(path, compress)
+
+
+def SummaryTable(readings):
+    """
+    HTML table of per-instrument statistics, instruments with out-of-limit readings in red
+    """
+    rows = [(HTML_ROW_RED if row[5] else HTML_ROW).format(*[escape(str(value)) for value in row])
+            for row in readings.BySerial().Summary()]
+    return HTML_SUMMARY_HEAD + "".join(rows) + HTML_SUMMARY_END
+
+
+def TableRows(readings, start=0, stop=None, outOfLimit=None, window=ROLLING_WINDOW, compact=False):
+    """
+    HTML table rows for readings[start:stop], out-of-limit rows in red, with Status and SN escaped
+    """
+    templates = (HTML_COMPACT_ROW, HTML_COMPACT_ROW_RED) if compact else (HTML_READING_ROW, HTML_READING_ROW_RED)
+    return "".join([templates[red].format(day, time, temp, high, low, escape(str(status)), escape(str(serial)),
+                                            *rolling)
+                    for red, day, time, temp, high, low, status, serial, *rolling in
+                    ReadingRows(readings, start, stop, outOfLimit, window)])
+
+
+def ReadingRows(readings, start=0, stop=None, outOfLimit=None, window=ROLLING_WINDOW):
+    """
+    Out-of-limit flag and table cells of readings[start:stop], with the rolling statistics
+    """
+    if outOfLimit is None:
+        outOfLimit = readings.OutOfLimit()
+    analytics = readings.Analyze(window)
+    return zip(outOfLimit[start:stop].tolist(), readings.Days(start, stop), readings.Times(start, stop),
+               readings.temps[start:stop].tolist(), readings.high[start:stop].tolist(),
+               readings.low[start:stop].tolist(), readings.Status(start, stop), readings.SN(start, stop),
+               ["{0:.2f}".format(value) for value in analytics.mean[start:stop].tolist()],
+               ["{0:.2f}".format(value) for value in analytics.std[start:stop].tolist()],
+               [str(timedelta(seconds=value)) for value in analytics.above[start:stop].tolist()],
+               [str(timedelta(seconds=value)) for value in analytics.below[start:stop].tolist()])
+
+
+def WriteReport(readings, outputFile, imagePath=None, chunkRows=1024, window=ROLLING_WINDOW):
+    """
+    PDF report of the readings table, preceded by the plot image when there is one.
+    Rows are formatted a chunk at a time and drawn with cells; page breaks repeat the column header.
+    """
+    return FinishReport(DrawReport(readings, chunkRows, window, bool(imagePath)), outputFile, imagePath)
+
+
+def FinishReport(pdf, outputFile, imagePath=None):
+    """
+    Place the plot image on the page DrawReport kept for it and write the PDF
+    """
+    if pdf.imagePage:
+        last = pdf.page
+        pdf.page = pdf.imagePage
+        if imagePath:
+            pdf.image(imagePath, x=45, y=pdf.imageY, w=0, h=160)
+        else:
+            pdf.set_xy(pdf.l_margin, pdf.imageY)
+            pdf.set_font('Arial', '', 10)
+            pdf.cell(0, 10, "The plot image could not be created.", align="C")
+        pdf.page = last
+    pdf.output(outputFile, "F")
+    pdf.close()
+    return outputFile
+
+
+def DrawReport(readings, chunkRows=1024, window=ROLLING_WINDOW, imagePage=True):
+    """
+    Lay out the pages of the PDF report, keeping the first page free for the plot image when
+    imagePage is set, so the table can be drawn while the image is still being rendered
+    """
+    pdf = MyPDF()
+    pdf.alias_nb_pages()
+    pdf.set_display_mode(zoom='real', layout='default')
+    pdf.set_auto_page_break(True, margin=20)
+    pdf.set_title("Reagent Carousel Temperature Report")
+    pdf.set_author("Rick Roll")
+    if imagePage:
+        pdf.add_page("L")
+        pdf.imagePage, pdf.imageY = pdf.page, pdf.get_y()
+
+    outOfLimit = readings.OutOfLimit()
+    pdf.add_page("L")
+    pdf.columns = PDF_SUMMARY_COLUMNS
+    pdf.tableX = (297 - sum(width for _, width in pdf.columns)) / 2.0
+    pdf.set_font('Arial', 'B', 10)
+    pdf.set_x(pdf.tableX)
+    pdf.cell(0, 6, "{0} readings, {1} out of limit".format(len(readings), int(outOfLimit.sum())), ln=1)
+    pdf.tableHeader = True
+    pdf.TableHeader()
+    for row in readings.BySerial().Summary():
+        pdf.set_text_color(*((255, 0, 0) if row[5] else (0, 0, 0)))
+        pdf.set_x(pdf.tableX)
+        for (_, width), value in zip(pdf.columns, row):
+            pdf.cell(width, 5, str(value), border=1, align="C")
+        pdf.ln()
+    pdf.set_text_color(0, 0, 0)
+    pdf.tableHeader = False
+    pdf.ln(5)
+
+    excursions = readings.Analyze(window).Excursions()
+    if excursions:
+        pdf.columns = PDF_EXCURSION_COLUMNS
+        pdf.tableX = (297 - sum(width for _, width in pdf.columns)) / 2.0
+        pdf.TableHeader()
+        pdf.tableHeader = True
+        pdf.set_text_color(255, 0, 0)
+        for row in excursions:
+            pdf.set_x(pdf.tableX)
+            for (_, width), value in zip(pdf.columns, row):
+                pdf.cell(width, 5, str(value), border=1, align="C")
+            pdf.ln()
+        pdf.set_text_color(0, 0, 0)
+        pdf.tableHeader = False
+        pdf.ln(5)
+
+    pdf.columns = PDF_COLUMNS
+    pdf.tableX = (297 - sum(width for _, width in pdf.columns)) / 2.0
+    pdf.set_font('Arial', '', 9)
+    pdf.set_x(pdf.tableX)
+    pdf.cell(0, 5, "Rolling statistics over the previous {0}".format(timedelta(seconds=window)), ln=1)
+    pdf.TableHeader()
+    pdf.tableHeader = True
+
+    widths = [width for _, width in PDF_COLUMNS]
+    pdf.set_font('Arial', '', 9)
+    for start in range(0, len(readings), chunkRows):
+        stop = start + chunkRows
+        for red, *row in ReadingRows(readings, start, stop, outOfLimit, window):
+            if red:
+                pdf.set_text_color(255, 0, 0)
+            pdf.set_x(pdf.tableX)
+            for width, value in zip(widths, row):
+                pdf.cell(width, 5, str(value), border=1, align="C")
+            pdf.ln()
+            if red:
+                pdf.set_text_color(0, 0, 0)
+    pdf.tableHeader = False
+    return pdf
+
+
+def LoadReadings(path, cache=None, cancelled=None):
+    """
+    Readings for a file, from the cache when it holds a current copy
+    """
+    # Arrow files are memory mapped already, hashing them for the cache would cost more than the read
+    if cache is None or READERS.get(os.path.splitext(path)[1].lower()) is ReadArrow:
+        return ReadFile(path, cancelled)
+    key = cache.Key(path)
+    readings = cache.Get(key)
+    if readings is None:
+        readings = ReadFile(path, cancelled)
+        try:
+            cache.Put(key, readings)
+        except OSError as ex:
+            logging.warning("Could not cache temperature data: {0}".format(ex))
+    readings.source = path
+    return readings
+
+
+def ProcessMemory():
+    """
+    Current and peak resident memory of this process in MB, either None where it cannot be read
+    """
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + \
+                       [(name, ctypes.c_size_t) for name in (
+                           "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                           "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                        ctypes.byref(counters), counters.cb):
+            return None, None
+        return counters.WorkingSetSize / 1048576.0, counters.PeakWorkingSetSize / 1048576.0
+    current = None
+    try:
+        with open("/proc/self/statm") as file:
+            current = int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576.0
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return current, None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return current, peak / (1048576.0 if sys.platform == "darwin" else 1024.0)
+
+
+def PeakMemory():
+    """
+    Peak resident memory of this process in MB since it started, None where it cannot be read
+    """
+    peak = ProcessMemory()[1]
+    return None if peak is None else round(peak, 1)
+
+
+class MemorySampler(object):
+    """
+    Highest resident memory of the process while a stage runs, sampled on a background thread.
+    Spikes shorter than the interval can be missed, and stages running side by side in the
+    same process are included in each other's figures.
+    """
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start = self.peak = ProcessMemory()[0]
+        self.stopped = threading.Event()
+        self.thread = None
+        if self.start is not None:
+            self.thread = threading.Thread(target=self.Run, daemon=True)
+            self.thread.start()
+
+    def Run(self):
+        while not self.stopped.wait(self.interval):
+            self.Sample()
+
+    def Sample(self):
+        current = ProcessMemory()[0]
+        if current is not None and current > self.peak:
+            self.peak = current
+
+    def Stop(self):
+        """
+        Peak and growth over the starting size, in MB, None where memory cannot be read
+        """
+        if self.thread is None:
+            return None, None
+        self.stopped.set()
+        self.thread.join()
+        self.Sample()
+        return round(self.peak, 1), round(self.peak - self.start, 1)
+
+
+class Metrics(object):
+    """
+    Wall time, row count and memory of each pipeline stage, appended to a JSON-lines file.
+    peakMB is the highest resident memory sampled while the stage ran and deltaMB its growth over
+    the size at the start; processPeakMB is the high-water mark of the process.
+    With profileDir set, each outermost stage is also run under cProfile and dumped there, and
+    tracemalloc adds the peak Python allocation of every stage that did not run alongside stages
+    on other threads.
+    """
+    def __init__(self, path=METRICS_FILE, profileDir=None, report=None):
+        self.path = path
+        self.profileDir = profileDir
+        self.report = report
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # open traced stages of each thread, as [peak so far, overlapped another thread] entries
+        self.traced = {}
+        if profileDir:
+            os.makedirs(profileDir, exist_ok=True)
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def __getstate__(self):
+        # batch workers get a copy without the lock, thread state or GUI callback
+        return {"path": self.path, "profileDir": self.profileDir}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["profileDir"])
+
+    @contextmanager
+    def Stage(self, name, source=None, rows=None):
+        """
+        Time the body as one stage; set record["rows"] inside it when the count is known then
+        """
+        record = {"stage": name, "source": source, "rows": rows}
+        profile = self.StartProfile()
+        if self.profileDir:
+            self.TraceStart()
+        memory = MemorySampler()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            peak, delta = memory.Stop()
+            if self.profileDir:
+                record["tracedMB"] = self.TraceStop()
+            if profile is not None:
+                self.StopProfile(profile, name)
+            self.Record(name, seconds, record["rows"], source, record.get("tracedMB"), peak, delta)
+
+    def Record(self, name, seconds, rows=None, source=None, tracedMB=None, peakMB=None, deltaMB=None):
+        record = {"time": datetime.now().isoformat(timespec="seconds"), "stage": name, "source": source,
+                  "seconds": round(seconds, 4), "rows": rows, "peakMB": peakMB, "deltaMB": deltaMB,
+                  "processPeakMB": PeakMemory()}
+        if rows and seconds > 0:
+            record["rowsPerSecond"] = int(rows / seconds)
+        if tracedMB is not None:
+            record["tracedMB"] = tracedMB
+        logging.debug("{0} took {1:.3f} s".format(name, seconds))
+        if self.path:
+            try:
+                with self.lock:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    with open(self.path, 'a') as file:
+                        file.write(json.dumps(record) + "\n")
+            except OSError as ex:
+                logging.warning("Could not write metrics: {0}".format(ex))
+        if self.report is not None:
+            self.report(record)
+        return record
+
+    def StartProfile(self):
+        if not self.profileDir or getattr(self.local, "profiling", False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as ex:
+            logging.debug("Not profiling stage: {0}".format(ex))
+            return None
+        self.local.profiling = True
+        return profile
+
+    def StopProfile(self, profile, name):
+        profile.disable()
+        self.local.profiling = False
+        path = os.path.join(self.profileDir, "{0}-{1}.prof".format(name, datetime.now().strftime("%Y%m%d-%H%M%S-%f")))
+        profile.dump_stats(path)
+        logging.info("Profile of {0} written to {1}".format(name, path))
+
+    def TraceStart(self):
+        """
+        Open a traced stage on this thread. tracemalloc keeps a single peak for the whole process,
+        so when stages overlap on other threads none of them gets a figure, rather than a wrong one.
+        """
+        with self.lock:
+            thread = threading.get_ident()
+            current, peak = tracemalloc.get_traced_memory()
+            stack = self.traced.setdefault(thread, [])
+            # fold the peak so far into the enclosing stage before resetting it for this one
+            if stack:
+                stack[-1][0] = max(stack[-1][0], peak)
+            stack.append([current, False])
+            if len(self.traced) > 1:
+                for entries in self.traced.values():
+                    for entry in entries:
+                        entry[1] = True
+            elif hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+
+    def TraceStop(self):
+        with self.lock:
+            thread = threading.get_ident()
+            stack = self.traced.get(thread)
+            if not stack:
+                return None
+            peak, overlapped = stack.pop()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1][0] = max(stack[-1][0], peak)
+                stack[-1][1] = stack[-1][1] or overlapped
+            else:
+                del self.traced[thread]
+        if overlapped:
+            logging.debug("Not reporting tracedMB, the stage overlapped stages on other threads")
+            return None
+        return round(peak / 1048576.0, 1)
+
+
+def RunStage(metrics, name, source, rows, function, args):
+    """
+    Run one stage of a TaskGraph, timed as a metrics stage when metrics are kept
+    """
+    if metrics is None:
+        return function(*args)
+    with metrics.Stage(name, source, rows):
+        return function(*args)
+
+
+class TaskGraph(object):
+    """
+    Output stages that only depend on the parsed readings, and some on each other. Every stage is
+    submitted to the executor as soon as the stages it runs after have finished, with their results
+    appended to its arguments, so independent stages run side by side on a thread or process pool.
+    """
+    def __init__(self, metrics=None, source=None, rows=None):
+        self.metrics = metrics
+        self.source = source
+        self.rows = rows
+        self.tasks = OrderedDict()
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def Add(self, name, function, *args, after=()):
+        missing = [task for task in after if task not in self.tasks]
+        if missing:
+            raise ValueError("{0} runs after unknown stages {1}".format(name, ", ".join(missing)))
+        self.tasks[name] = (function, args, tuple(after))
+        return self
+
+    def Run(self, executor, done=None, failed=None):
+        """
+        Run every stage and return their results by name, calling done(name, result) as each one
+        finishes. When a stage fails the stages after it are not started, the running ones are
+        waited for and the first error is raised, unless failed(name, error) is given to take it.
+        """
+        pending = OrderedDict(self.tasks)
+        running = {}
+        results = {}
+        error = None
+        while pending or running:
+            for name, (function, args, after) in list(pending.items()):
+                if error is None and all(task in results for task in after):
+                    del pending[name]
+                    future = executor.submit(RunStage, self.metrics, name, self.source, self.rows, function,
+                                             args + tuple(results[task] for task in after))
+                    running[future] = name
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as ex:
+                    logging.error("{0} failed: {1}".format(name, ex))
+                    if failed is None:
+                        error = error or ex
+                    else:
+                        failed(name, ex)
+                    continue
+                if done is not None:
+                    done(name, results[name])
+        if error is not None:
+            raise error
+        return results
+
+
+def FindExports(pattern):
+    """
+    Base directory and sorted reading files for a directory (searched recursively) or a glob pattern.
+    In a directory an export converted to a columnar file is read from the converted copy, as long
+    as the copy is not older than the export it was made from.
+    """
+    if os.path.isdir(pattern):
+        sources, copies = {}, {}
+        for extension in READERS:
+            for name in glob.glob(os.path.join(pattern, "**", "*" + extension), recursive=True):
+                stem = os.path.splitext(name)[0]
+                found = sources if READERS[os.path.splitext(name)[1].lower()] in (ReadJson, ReadCsv) else copies
+                found.setdefault(stem, name)
+        files = dict(copies)
+        for stem, source in sources.items():
+            copy = copies.get(stem)
+            if copy is not None and os.path.getmtime(copy) < os.path.getmtime(source):
+                logging.info("{0} is older than {1}, reading the source instead".format(copy, source))
+                copy = None
+            files[stem] = copy or source
+        return pattern, sorted(files.values())
+    files = sorted(glob.glob(pattern, recursive=True))
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(name)) for name in files]) if files else ""
+    return base, files
+
+
+def BatchName(path, base):
+    """
+    Output folder name for one export, unique within the batch since every export is named 8500_RCTT.json
+    """
+    relative = os.path.relpath(os.path.splitext(os.path.abspath(path))[0], os.path.abspath(base))
+    return re.sub(r"[^\w.-]+", "_", relative)
+
+
+def StageDone(source, name, result):
+    logging.info("{0}: {1} finished".format(source, name))
+
+
+def PlotTask(readings, path, maxPoints=PLOT_POINTS, window=ROLLING_WINDOW, static=None, compress=False):
+    """
+    WritePlot as a stage, returning the path written rather than the figure
+    """
+    WritePlot(readings, path, maxPoints, window, static, compress)
+    return OutputName(path, compress)
+
+
+def ReportTask(path, pdf, images=None):
+    """
+    FinishReport as a stage run after DrawReport and WriteImages, with the first image written
+    """
+    return FinishReport(pdf, path, images[0] if images else None)
+
+
+def OutputGraph(readings, outDir, images=False, maxPoints=PLOT_POINTS, window=ROLLING_WINDOW, static=None,
+                compress=False, metrics=None, plot=True, table=True, plotPath=None, tablePath=None, imagePath=None,
+                filteredPath=None, reportPath=None):
+    """
+    Task graph writing the plot and table and, with images, the plot PNGs and PDF report. Each output
+    goes into outDir under its usual name unless its own path is given; plot and table can be left out.
+    The report pages are drawn alongside the others; only writing the finished PDF waits for the plot image.
+    """
+    # the analytics are shared by the table, plot and report, so compute them once before they start
+    readings.Analyze(window)
+    readings.BySerial()
+    graph = TaskGraph(metrics, readings.source, len(readings))
+    if plot:
+        graph.Add("WritePlot", PlotTask, readings, plotPath or os.path.join(outDir, "plot.html"), maxPoints, window,
+                  static, compress)
+    if table:
+        graph.Add("WriteTable", WriteTable, readings, tablePath or os.path.join(outDir, "HTMLTable.html"), 4096,
+                  window, static, compress)
+    if images:
+        graph.Add("WriteImages", WriteImages, readings, imagePath or os.path.join(outDir, PLOT_IMAGE),
+                  filteredPath or os.path.join(outDir, PLOT_IMAGE_FILTERED), maxPoints)
+        graph.Add("DrawReport", DrawReport, readings, 1024, window)
+        graph.Add("WriteReport", ReportTask, reportPath or os.path.join(outDir, REPORT_FILE),
+                  after=("DrawReport", "WriteImages"))
+    return graph
+
+
+def RenderFile(path, outDir, images=False, maxPoints=PLOT_POINTS, metrics=None, start=None, end=None,
+               window=ROLLING_WINDOW, static=None, compress=False, executor=None, cache=CACHE_DIR):
+    """
+    Write the plot, table and, with images, the plot PNG and PDF report of one export into outDir,
+    limited to readings from start up to end when those are given. With static the pages link the
+    shared assets in that folder, and with compress they are written gzip compressed.
+    The outputs are written side by side on executor, or on a pool of STAGE_WORKERS threads.
+    Parsed files are cached in the cache directory, or not at all when it is None.
+    Runs in a worker process, so it reports back with a plain dict instead of raising.
+    """
+    if metrics is None:
+        metrics = Metrics(None)
+    summary = {"source": path, "folder": outDir, "rows": 0, "outOfLimit": 0, "error": None}
+    try:
+        with metrics.Stage("ReadData", path) as stage:
+            readings = LoadReadings(path, ReadingCache(cache) if cache else None)
+            if start is not None or end is not None:
+                readings = readings.Between(start, end)
+            stage["rows"] = len(readings)
+        if not readings:
+            raise ValueError("No readings found" if start is None and end is None else "No readings in range")
+        os.makedirs(outDir, exist_ok=True)
+        summary.update(rows=len(readings), outOfLimit=int(readings.OutOfLimit().sum()),
+                       first=str(readings.Datetimes().min()), last=str(readings.Datetimes().max()),
+                       low=float(readings.temps.min()), high=float(readings.temps.max()),
+                       serials=", ".join(readings.snTable))
+        graph = OutputGraph(readings, outDir, images, maxPoints, window, static, compress, metrics)
+        with metrics.Stage("RenderOutputs", path, len(readings)):
+            if executor is None:
+                with ThreadPoolExecutor(max_workers=STAGE_WORKERS) as pool:
+                    graph.Run(pool, partial(StageDone, path))
+            else:
+                graph.Run(executor, partial(StageDone, path))
+    except Exception as ex:
+        logging.error("Could not render {0}: {1}".format(path, ex))
+        summary["error"] = "{0}: {1}".format(type(ex).__name__, ex)
+    return summary
+
+
+def WriteBatchIndex(summaries, outDir, static=None):
+    """
+    Summary page linking the outputs of every export in a batch
+    """
+    path = os.path.join(outDir, "index.html")
+    with open(path, 'w') as html:
+        if static is None:
+            html.write(HTML_STYLE + BATCH_INDEX_HEAD)
+        else:
+            html.write(HTML_LINKED_STYLE.format(StaticLink(path, StaticAsset(static, REPORT_CSS, text=StyleSheet()))))
+            html.write(Compact(BATCH_INDEX_HEAD))
+        for summary in summaries:
+            folder = os.path.relpath(summary["folder"], outDir).replace(os.sep, "/")
+            links = [name for output in ("plot.html", "HTMLTable.html", REPORT_FILE) for name in (output, output + ".gz")
+                     if os.path.isfile(os.path.join(summary["folder"], name))]
+            cells = [escape(summary["source"]), summary["rows"], summary["outOfLimit"],
+                     summary.get("first", ""), summary.get("last", ""), summary.get("low", ""),
+                     summary.get("high", ""), escape(summary.get("serials", "")),
+                     " ".join('<a href="{0}/{1}">{1}</a>'.format(escape(folder), name) for name in links)
+                     or escape(summary["error"] or "")]
+            template = HTML_ROW_RED if summary["outOfLimit"] or summary["error"] else HTML_ROW
+            html.write(template.replace("</td></tr>", "</td><td>{7}</td><td>{8}</td></tr>").format(*cells))
+        html.write(HTML_TABLE_END)
+    return path
+
+
+def RunBatch(pattern, outDir, images=False, workers=None, progress=None, maxPoints=PLOT_POINTS, metrics=None,
+             start=None, end=None, window=ROLLING_WINDOW, shared=False, compress=False, cache=CACHE_DIR):
+    """
+    Render every export matched by pattern on a process pool, each into its own folder under outDir,
+    and return the path of the batch index page. With shared every page links one copy of the
+    CSS and BokehJS in outDir/static.
+    """
+    base, files = FindExports(pattern)
+    if not files:
+        raise ValueError("No reading files match {0}".format(pattern))
+    os.makedirs(outDir, exist_ok=True)
+    static = os.path.join(outDir, STATIC_DIR) if shared else None
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(RenderFile, path, os.path.join(outDir, BatchName(path, base)), images, maxPoints,
+                               metrics, start, end, window, static, compress, None, cache)
+                   for path in files]
+        try:
+            for future in as_completed(futures):
+                summaries.append(future.result())
+                if progress is not None:
+                    progress(len(summaries), len(files), summaries[-1])
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    summaries.sort(key=lambda summary: summary["source"])
+    return WriteBatchIndex(summaries, outDir, static)
+
+
+class Cancelled(Exception):
+    """
+    Raised inside the pipeline when a running load is reset
+    """
+
+
+class MyPDF(fpdf.FPDF):
+    def __init__(self, orientation='P', unit='mm', format='A4'):
+        super().__init__(orientation='P', unit='mm', format='A4')
+        self.tableHeader = False
+        self.tableX = 10
+        self.columns = PDF_COLUMNS
+        # page kept free for the plot image, and where on it the image goes
+        self.imagePage = None
+        self.imageY = None
+
+
+    def header(self):
+        """
+        Header on each page
+        """
+        # set the font for the header, B=Bold
+        self.set_font("Arial", style="B", size=15)
+
+        # insert my logo
+        self.image("Icons" + os.sep + "Thermometer.png", x=90, y=5, w=15)
+        # position logo on the right
+        self.cell(w=80)
+
+        # page title, in black even when the page break came in the middle of a red row
+        self.set_text_color(0, 0, 0)
+        self.cell(120.0, 5.0, "Reagent Carousel Temperature Report", ln=0, align="C")
+
+        # insert a line break of 20 pixels
+        self.ln(15)
+
+        # repeat the column header on pages the readings table runs onto
+        if self.tableHeader:
+            self.TableHeader()
+
+    def TableHeader(self):
+        self.set_font("Arial", style="B", size=10)
+        self.set_fill_color(0, 51, 102)
+        self.set_draw_color(0, 140, 186)
+        self.set_text_color(255, 255, 255)
+        self.set_x(self.tableX)
+        for name, width in self.columns:
+            self.cell(width, 6, name, border=1, align="C", fill=True)
+        self.ln()
+        self.set_font("Arial", size=9)
+        self.set_text_color(0, 0, 0)
+
+    def footer(self):
+        """
+        Footer on each page
+        """
+        # set the font, I=italic
+        self.set_font("Arial", style="B", size=9)
+
+        # position footer at 15mm from the bottom
+        self.set_y(-15)
+
+        # display the page number and center it
+        pageNum = "Page %s of {nb}" % self.page_no()
+        self.cell(0, 10, pageNum, align="C")
+
+
+def Serve(path, port, maxPoints=PLOT_POINTS, interval=1.0, start=None, end=None):
+    """
+    Serve the plot of path and stream readings appended to it until interrupted
+    """
+    readings = LoadReadings(path).Between(start, end)
+    server = PlotServer(port, maxPoints).Start()
+    server.Show(readings)
+    print("Serving {0} readings at {1}".format(len(readings), server.Url()))
+    try:
+        while True:
+            time.sleep(interval)
+            new = ReadAppended(readings)
+            if new is None:
+                logging.info("{0} was rewritten, reloading".format(path))
+                readings = LoadReadings(path).Between(start, end)
+                server.Show(readings)
+            elif new:
+                server.Stream(readings, readings.Extend(new.Between(start, end)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.Stop()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="tempreader", description="Reagent carousel temperature reader")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every pipeline step")
+    parser.add_argument("--metrics", metavar="FILE", help="append per-stage timings to FILE as JSON lines")
+    parser.add_argument("--profile", metavar="DIR", help="write a cProfile dump of each stage to DIR")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    render = commands.add_parser("render", help="plot and tabulate one temperature file")
+    render.add_argument("file", help="temperature file, e.g. 8500_RCTT.json")
+    render.add_argument("--out", default="Plots", help="output directory (default: Plots)")
+    render.add_argument("--pdf", action="store_true", help="also write the plot image and PDF report")
+    render.add_argument("--start", help="first date to include, e.g. 2016-09-01")
+    render.add_argument("--end", help="last date to include, e.g. 2016-09-30")
+    render.add_argument("--window", type=ParseWindow, default=ROLLING_WINDOW,
+                        help="rolling statistics window, e.g. 900, 30m or 6h (default: 1h)")
+    render.add_argument("--points", type=int, default=PLOT_POINTS, help="maximum plotted points")
+    render.add_argument("--shared", action="store_true",
+                        help="link CSS and BokehJS written once into OUT/static instead of inlining them")
+    render.add_argument("--gzip", action="store_true", help="write the HTML pages gzip compressed")
+    render.add_argument("--processes", action="store_true",
+                        help="write the outputs in worker processes rather than threads")
+
+    batch = commands.add_parser("batch", help="render every temperature file in a directory or glob")
+    batch.add_argument("pattern", help="directory searched recursively for temperature files, or a glob pattern")
+    batch.add_argument("--out", default="Plots" + os.sep + "Batch", help="output directory (default: Plots/Batch)")
+    batch.add_argument("--pdf", action="store_true", help="also write plot images and PDF reports")
+    batch.add_argument("--start", help="first date to include, e.g. 2016-09-01")
+    batch.add_argument("--end", help="last date to include, e.g. 2016-09-30")
+    batch.add_argument("--window", type=ParseWindow, default=ROLLING_WINDOW,
+                        help="rolling statistics window, e.g. 900, 30m or 6h (default: 1h)")
+    batch.add_argument("--points", type=int, default=PLOT_POINTS, help="maximum plotted points per file")
+    batch.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    batch.add_argument("--shared", action="store_true",
+                       help="link CSS and BokehJS written once into OUT/static instead of inlining them")
+    batch.add_argument("--gzip", action="store_true", help="write the HTML pages gzip compressed")
+    for command in (render, batch):
+        command.add_argument("--cache", metavar="DIR", default=CACHE_DIR,
+                             help="directory caching parsed files (default: {0})".format(CACHE_DIR))
+        command.add_argument("--no-cache", dest="cache", action="store_const", const=None,
+                             help="parse every file without reading or writing the cache")
+        # also accepted after the command; SUPPRESS keeps the subcommand from resetting an earlier value
+        command.add_argument("--metrics", metavar="FILE", default=argparse.SUPPRESS,
+                             help="append per-stage timings to FILE as JSON lines")
+        command.add_argument("--profile", metavar="DIR", default=argparse.SUPPRESS,
+                             help="write a cProfile dump of each stage to DIR")
+
+    serve = commands.add_parser("serve", help="serve a live plot of one temperature file")
+    serve.add_argument("file", help="temperature file, e.g. 8500_RCTT.json")
+    serve.add_argument("--port", type=int, default=5006, help="server port (default: 5006)")
+    serve.add_argument("--start", help="first date to include, e.g. 2016-09-01")
+    serve.add_argument("--end", help="last date to include, e.g. 2016-09-30")
+    serve.add_argument("--points", type=int, default=PLOT_POINTS, help="maximum plotted points")
+
+    convert = commands.add_parser("convert", help="convert temperature files to Parquet or Arrow")
+    convert.add_argument("files", nargs="+", help="temperature files, e.g. 8500_RCTT.json")
+    convert.add_argument("--to", default=".arrow", choices=(".arrow", ".parquet"),
+                         help="columnar format (default: .arrow, memory mapped when read)")
+    convert.add_argument("--out", help="output directory (default: next to each file)")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(levelname)s: %(message)s')
+
+    if args.command == "convert":
+        failed = 0
+        for path in args.files:
+            output = None
+            if args.out:
+                os.makedirs(args.out, exist_ok=True)
+                output = os.path.join(args.out, os.path.splitext(os.path.basename(path))[0] + args.to)
+            try:
+                print("{0} -> {1}".format(path, ConvertFile(path, output, args.to)))
+            except (OSError, ValueError) as ex:
+                logging.error("Could not convert {0}: {1}".format(path, ex))
+                failed += 1
+        return 1 if failed else 0
+
+    metrics = Metrics(args.metrics, args.profile) if args.metrics or args.profile else None
+    try:
+        start, end = ParseRange(args.start, args.end)
+    except ValueError as ex:
+        logging.error(str(ex))
+        return 1
+    if args.command == "render":
+        static = os.path.join(args.out, STATIC_DIR) if args.shared else None
+        if args.processes:
+            with ProcessPoolExecutor(max_workers=STAGE_WORKERS) as executor:
+                summary = RenderFile(args.file, args.out, args.pdf, args.points, metrics, start, end,
+                                     args.window, static, args.gzip, executor, args.cache)
+        else:
+            summary = RenderFile(args.file, args.out, args.pdf, args.points, metrics, start, end,
+                                 args.window, static, args.gzip, cache=args.cache)
+        if summary["error"]:
+            return 1
+        print("{rows} readings, {outOfLimit} out of limit, written to {folder}".format(**summary))
+        return 0
+
+    if args.command == "serve":
+        return Serve(args.file, args.port, args.points, start=start, end=end)
+
+    def progress(done, total, summary):
+        print("[{0}/{1}] {2}: {3}".format(done, total, summary["source"],
+                                          summary["error"] or "{0} readings".format(summary["rows"])))
+
+    try:
+        index = RunBatch(args.pattern, args.out, args.pdf, args.workers, progress, args.points, metrics, start, end,
+                         args.window, args.shared, args.gzip, args.cache)
+    except ValueError as ex:
+        logging.error(str(ex))
+        return 1
+    print("Batch index written to {0}".format(index))
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -12,46 +12,249 @@ Usage:
 """
 import json
 import logging
+import multiprocessing
 import os
-import shutil
 import subprocess
 import sys
 import time
+import webbrowser
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from logging.handlers import RotatingFileHandler
 
-import fpdf
 from PyQt5 import QtCore, QtGui, QtWidgets, uic
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
-from PyQt5.QtWidgets import QApplication, QFileDialog, QMainWindow, QMessageBox, QSplashScreen, QTreeWidgetItem, QWidget
-from bokeh.io import export_png
-from bokeh.layouts import column
-from bokeh.models import CDSView, ColumnDataSource, HoverTool, IndexFilter
-from bokeh.plotting import figure, output_file, save
-from fpdf import HTMLMixin
+from PyQt5.QtWidgets import QAbstractItemView, QApplication, QDateEdit, QFileDialog, QHeaderView, QLabel, \
+    QMainWindow, QMessageBox, QSplashScreen, QTableView, QTreeWidgetItem, QWidget
+
+from TempReader import METRICS_FILE, PLOT_IMAGE, PLOT_IMAGE_FILTERED, PLOT_POINTS, READERS, REPORT_FILE, \
+    STAGE_WORKERS, STATIC_DIR, Cancelled, LoadReadings, Metrics, OutputGraph, ParseRange, PlotColumns, PlotServer, \
+    ReadAppended, ReadingCache, RunBatch, TableRows, WriteReport
 
 qtCreatorFile = "UI" + os.sep + "tempR5.ui"
 
-Ui_MainWindow, QtBaseClass = uic.loadUiType(qtCreatorFile)
+FILE_FILTER = "Temp File (*{0});;JSON Export (8500_RCTT.json)".format(" *".join(sorted(READERS)))
+
+# appends are usually written in bursts, so wait for the file to settle before reading it
+WATCH_DELAY = 500
+
+STREAM_SCRIPT = """
+(function() {{
+    var doc = Bokeh.documents[0];
+    var source = doc.get_model_by_name('readings');
+    var filter = doc.get_model_by_name('outOfLimit');
+    var view = doc.get_model_by_name('outOfLimitView');
+    var start = source.data['Day'].length;
+    source.stream({0});
+    if (filter) {{
+        filter.indices = filter.indices.concat({1}.map(function(i) {{ return i + start; }}));
+        view.filters = [filter];
+    }}
+}})();
+"""
+
+TABLE_SCRIPT = "document.getElementById('readings').insertAdjacentHTML('beforeend', {0});"
+
+
+class WorkerSignals(QObject):
+    progress = pyqtSignal(str)
+    warning = pyqtSignal(str)
+    finished = pyqtSignal(object)
+    error = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class PipelineWorker(QRunnable):
+    """
+    Reads one temperature file and builds its plot and table off the GUI thread
+    """
+    def __init__(self, app, path):
+        super().__init__()
+        self.app = app
+        self.path = path
+        self.signals = WorkerSignals()
+        self.cancelled = False
+
+    def Cancel(self):
+        self.cancelled = True
+
+    def IsCancelled(self):
+        return self.cancelled
+
+    def Step(self, message):
+        if self.cancelled:
+            raise Cancelled()
+        logging.debug(message)
+        self.signals.progress.emit(message)
+
+    def Warn(self, message):
+        self.signals.warning.emit(message)
+
+    def Process(self):
+        self.Step("Reading file, please wait.")
+        readings = self.app.ReadData(self.path, self)
+        if not readings:
+            raise ValueError("No readings found in {0}".format(self.path))
+        html, table = self.app.CreatePlot(readings, self)
+        return readings, html, table
+
+    def run(self):
+        try:
+            result = self.Process()
+            self.Step("Loading plots, please wait.")
+            self.signals.finished.emit(result)
+        except Cancelled:
+            logging.info("Processing of {0} cancelled".format(self.path))
+            self.signals.cancelled.emit()
+        except Exception as ex:
+            logging.error("Exception occurred processing data: {0}".format(ex))
+            self.signals.error.emit(str(ex))
+
+
+class BatchWorker(PipelineWorker):
+    """
+    Renders every export under a directory on a process pool
+    """
+    def __init__(self, app, path, images, shared=False):
+        super().__init__(app, path)
+        self.images = images
+        self.shared = shared
+
+    def Progress(self, done, total, summary):
+        self.Step("Rendered {0} of {1} files.".format(done, total))
+
+    def Process(self):
+        self.Step("Starting batch, please wait.")
+        index = RunBatch(self.path, "Plots" + os.sep + "Batch", self.images, progress=self.Progress,
+                         shared=self.shared)
+        return None, index, None
+
+
+class TailWorker(PipelineWorker):
+    """
+    Reads the readings appended to the watched file since it was last parsed, and works out
+    their rolling statistics so TailFinished only has to append them
+    """
+    def Process(self):
+        readings = self.app.readings
+        new = ReadAppended(readings)
+        if not new:
+            return new, None
+        if self.app.dateRange is not None:
+            new = new.Between(*self.app.dateRange)
+        return new, readings.Prepare(new)
+
+    def run(self):
+        try:
+            self.signals.finished.emit(self.Process())
+        except Exception as ex:
+            logging.error("Exception occurred reading appended data: {0}".format(ex))
+            self.signals.error.emit(str(ex))
+
+
+class ReadingsTableModel(QAbstractTableModel):
+    """
+    Table model over a Readings store that only formats the rows the view asks for
+    """
+    HEADERS = ("Date", "Time", "Temp", "High", "Low", "Status", "SN")
+    BLOCK = 256
 
+    def __init__(self, readings, parent=None):
+        super().__init__(parent)
+        self.readings = readings
+        self.outOfLimit = readings.OutOfLimit()
+        self.blocks = {}
+        self.red = QBrush(QColor("red"))
 
-class TempReaderApp(QMainWindow, Ui_MainWindow):
-    def __init__(self):
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.readings)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def Rows(self, row):
+        """
+        Formatted cells for the block of rows containing row, keeping only a few blocks around
+        """
+        block = row // self.BLOCK
+        rows = self.blocks.get(block)
+        if rows is None:
+            if len(self.blocks) >= 16:
+                self.blocks.clear()
+            start, stop = block * self.BLOCK, (block + 1) * self.BLOCK
+            readings = self.readings
+            rows = self.blocks[block] = list(zip(readings.Days(start, stop), readings.Times(start, stop),
+                                                 map(str, readings.temps[start:stop].tolist()),
+                                                 map(str, readings.high[start:stop].tolist()),
+                                                 map(str, readings.low[start:stop].tolist()),
+                                                 readings.Status(start, stop), readings.SN(start, stop)))
+        return rows
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.Rows(index.row())[index.row() % self.BLOCK][index.column()]
+        if role == Qt.ForegroundRole and self.outOfLimit[index.row()]:
+            return self.red
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def RowsAppended(self, first):
+        """
+        Tell the view about rows the readings store gained from first onwards
+        """
+        self.beginInsertRows(QModelIndex(), first, len(self.readings) - 1)
+        # Extend appended the new rows' flags to the store's mask, so this does not recompute it
+        self.outOfLimit = self.readings.OutOfLimit()
+        # the last cached block may have been cut short by the old end of the data
+        self.blocks.pop(first // self.BLOCK, None)
+        self.endInsertRows()
+
+
+class TempReaderApp(QMainWindow):
+    stageFinished = pyqtSignal(object)
+
+    def __init__(self, profile=False):
         QMainWindow.__init__(self)
-        Ui_MainWindow.__init__(self)
-        self.setupUi(self)
+        uic.loadUi(qtCreatorFile, self)
         self.initUI()
 
+        # a single rotating handler; basicConfig(filename=...) on the same file logged every line twice
         logFile = "Logs" + os.sep + "TempReaderApp.log"
+        handler = RotatingFileHandler(logFile, maxBytes=5 * 1024 * 1024,
+                                      backupCount=1, encoding=None, delay=0)
         logging.basicConfig(level=logging.DEBUG,
                             format='%(asctime)s - %(funcName)s - Line %(lineno)d - %(levelname)s: %(message)s',
                             datefmt='%m-%d-%Y %I:%M:%S %p',
-                            filename=logFile,
-                            filemode='a')
-
-        handler = RotatingFileHandler(logFile, maxBytes=5 * 1024 * 1024,
-                                      backupCount=1, encoding=None, delay=0)
-        logging.getLogger().addHandler(handler)
+                            handlers=[handler])
+
+        self.stageFinished.connect(self.ShowMetrics)
+        self.metrics = Metrics(METRICS_FILE, "Logs" if profile else None, self.stageFinished.emit)
+        self.stages = []
+        self.showStarted = None
+        self.cache = ReadingCache()
+        self.threadPool = QThreadPool()
+        self.threadPool.setMaxThreadCount(1)
+        self.worker = None
+        self.tailWorker = None
+        self.readings = None
+        self.plotPoints = PLOT_POINTS
+        self.plotServer = None
+        self.dateRange = None
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.FileChanged)
+        self.watchTimer = QTimer(self)
+        self.watchTimer.setSingleShot(True)
+        self.watchTimer.setInterval(WATCH_DELAY)
+        self.watchTimer.timeout.connect(self.PollFile)
         logging.debug("Temperature app initialized")
 
 
@@ -88,6 +291,74 @@ class TempReaderApp(QMainWindow, Ui_MainWindow):
         self.sav_img.setCheckState(0, Qt.Unchecked)
         self.sav_img.setFont(0, font)
 
+        self.table_view = QTreeWidgetItem(self.treeWidget)
+        self.table_view.setFlags(self.table_view.flags() | Qt.ItemIsUserCheckable)
+        self.table_view.setText(0, "Fast Table View")
+        self.table_view.setCheckState(0, Qt.Unchecked)
+        self.table_view.setFont(0, font)
+
+        self.batch = QTreeWidgetItem(self.treeWidget)
+        self.batch.setFlags(self.batch.flags() | Qt.ItemIsUserCheckable)
+        self.batch.setText(0, "Batch Mode")
+        self.batch.setCheckState(0, Qt.Unchecked)
+        self.batch.setFont(0, font)
+
+        self.watch = QTreeWidgetItem(self.treeWidget)
+        self.watch.setFlags(self.watch.flags() | Qt.ItemIsUserCheckable)
+        self.watch.setText(0, "Watch File")
+        self.watch.setCheckState(0, Qt.Unchecked)
+        self.watch.setFont(0, font)
+
+        self.live = QTreeWidgetItem(self.treeWidget)
+        self.live.setFlags(self.live.flags() | Qt.ItemIsUserCheckable)
+        self.live.setText(0, "Live Plot Server")
+        self.live.setCheckState(0, Qt.Unchecked)
+        self.live.setFont(0, font)
+
+        self.range = QTreeWidgetItem(self.treeWidget)
+        self.range.setFlags(self.range.flags() | Qt.ItemIsUserCheckable)
+        self.range.setText(0, "Date Range")
+        self.range.setCheckState(0, Qt.Unchecked)
+        self.range.setFont(0, font)
+
+        self.shared = QTreeWidgetItem(self.treeWidget)
+        self.shared.setFlags(self.shared.flags() | Qt.ItemIsUserCheckable)
+        self.shared.setText(0, "Shared Assets")
+        self.shared.setCheckState(0, Qt.Unchecked)
+        self.shared.setFont(0, font)
+
+        self.startDate = QDateEdit(QDate.currentDate().addDays(-30), self.centralWidget())
+        self.startDate.setGeometry(50, 650, 120, 22)
+        self.endDate = QDateEdit(QDate.currentDate(), self.centralWidget())
+        self.endDate.setGeometry(181, 650, 120, 22)
+        for dateEdit in (self.startDate, self.endDate):
+            dateEdit.setCalendarPopup(True)
+            dateEdit.setDisplayFormat("MM-dd-yyyy")
+            dateEdit.setToolTip("Only load readings in this range when Date Range is checked")
+            dateEdit.raise_()
+
+        self.tableView = QTableView(self.tableTab)
+        self.tableView.setGeometry(self.webViewTable.geometry())
+        self.tableView.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tableView.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tableView.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.tableView.verticalHeader().setVisible(False)
+        self.tableView.verticalHeader().setDefaultSectionSize(20)
+        self.tableView.setStyleSheet("""
+        QTableView {
+            font-family: Arial, serif;
+            font-size: 13px;
+            gridline-color: #008CBA;
+            background-color: white;
+        }
+        QHeaderView::section {
+            background-color: #003366;
+            color: white;
+            border: 1px solid #008CBA;
+        }
+        """)
+        self.tableView.setVisible(False)
+
         self.webViewTable.page().mainFrame().setScrollBarPolicy(Qt.Horizontal, Qt.ScrollBarAlwaysOff)
         self.webViewTable.page().mainFrame().setScrollBarPolicy(Qt.Vertical, Qt.ScrollBarAlwaysOff)
         self.webViewTable.setEnabled(False)
@@ -99,6 +370,13 @@ class TempReaderApp(QMainWindow, Ui_MainWindow):
         """)
         self.tabWidget.setCurrentIndex(0)
 
+        self.metricsLbl = QLabel(self.centralWidget())
+        self.metricsLbl.setGeometry(10, 705, 321, 30)
+        self.metricsLbl.setWordWrap(True)
+        self.metricsLbl.setStyleSheet("color: #A0A0A0; font-size: 10px;")
+        self.metricsLbl.raise_()
+        self.webView.loadFinished.connect(self.PlotLoaded)
+
         self.miniBtn.clicked.connect(self.miniScreen)
 
     def center(self):
@@ -113,7 +391,12 @@ class TempReaderApp(QMainWindow, Ui_MainWindow):
     def LoadFile(self):
         logging.debug("Loading temperature file")
         self.CleanPlot()
-        self.fname = QFileDialog.getOpenFileName(self, 'Select file', '/home', 'Temp File (8500_RCTT.json)')
+        if self.batch.checkState(0) == 2:
+            directory = QFileDialog.getExistingDirectory(self, 'Select directory of exports', '/home',
+                                                         QFileDialog.ShowDirsOnly)
+            self.fname = (directory, None)
+        else:
+            self.fname = QFileDialog.getOpenFileName(self, 'Select file', '/home', FILE_FILTER)
         self.fileEdit.setText(self.fname[0])
 
         if not self.fname[0]:
@@ -125,59 +408,179 @@ class TempReaderApp(QMainWindow, Ui_MainWindow):
 
 
     def ProcessData(self):
-        file = self.LoadFile()
-        print("test")
-        self.tableTabLbl.setText("Loading file, please wait.")
-        self.tableTabLbl.setVisible(True)
-        self.plotTabLbl.setText("Loading file, please wait.")
-        self.plotTabLbl.setVisible(True)
-        QApplication.processEvents()
+        self.stages = []
+        with self.metrics.Stage("LoadFile"):
+            file = self.LoadFile()
+        self.ShowProgress("Loading file, please wait.")
 
         if not file:
             logging.debug("File not selected")
             return
         logging.debug("Processing data")
 
-        days, high, low, temps, status, sn, times = self.ReadData()
+        self.openbrowser = True if self.browser.checkState(0) == 2 else False
+        self.saveFiles = True if self.sav_img.checkState(0) == 2 else False
+        self.fastTable = True if self.table_view.checkState(0) == 2 else False
+        self.sharedAssets = True if self.shared.checkState(0) == 2 else False
+        self.dateRange = None
+        if self.range.checkState(0) == 2:
+            if self.startDate.date() > self.endDate.date():
+                MessageBox("The start date is after the end date.")
+                return
+            self.dateRange = ParseRange(self.startDate.date().toString("yyyy-MM-dd"),
+                                        self.endDate.date().toString("yyyy-MM-dd"))
+        if self.live.checkState(0) == 2 and self.plotServer is None:
+            try:
+                self.plotServer = PlotServer(maxPoints=self.plotPoints).Start()
+            except Exception as ex:
+                logging.error("Could not start the plot server: {0}".format(ex))
+                MessageBox("Error encountered starting the plot server: {0}".format(ex))
+        elif self.live.checkState(0) != 2 and self.plotServer is not None:
+            self.plotServer.Stop()
+            self.plotServer = None
+        self.StartPipeline(file)
+
+    def StartPipeline(self, file):
+        if self.batch.checkState(0) == 2:
+            worker = self.worker = BatchWorker(self, file, self.saveFiles, self.sharedAssets)
+        else:
+            worker = self.worker = PipelineWorker(self, file)
+        worker.signals.progress.connect(self.ShowProgress)
+        worker.signals.warning.connect(MessageBox)
+        worker.signals.finished.connect(partial(self.PipelineFinished, worker))
+        worker.signals.error.connect(partial(self.PipelineFailed, worker))
+        worker.signals.cancelled.connect(partial(self.PipelineCancelled, worker))
+        self.loadBtn.setEnabled(False)
+        self.threadPool.start(worker)
+
+    def ShowProgress(self, message):
+        self.tableTabLbl.setText(message)
+        self.tableTabLbl.setVisible(True)
+        self.plotTabLbl.setText(message)
+        self.plotTabLbl.setVisible(True)
 
-        if not all([days, high, low, temps, status, sn, times]):
-            logging.error("Could not process data from temperature file, list is None")
-            return None
+    def PipelineFinished(self, worker, result):
+        if worker is not self.worker or worker.cancelled:
+            return
+        self.worker = None
+        self.loadBtn.setEnabled(True)
+        readings, html, table = result
+        self.readings = readings
+        if self.fastTable and readings is not None:
+            self.tableView.setModel(ReadingsTableModel(readings, self.tableView))
+        if readings is not None and self.dateRange is None:
+            # offer the span of the file as the starting point for a narrower load
+            days = readings.Datetimes()
+            self.startDate.setDate(QDate.fromString(str(days.min())[:10], "yyyy-MM-dd"))
+            self.endDate.setDate(QDate.fromString(str(days.max())[:10], "yyyy-MM-dd"))
+        self.ShowPlots(html, table)
+        if readings is not None and self.watch.checkState(0) == 2:
+            self.StartWatching(readings.source)
+
+    def PipelineFailed(self, worker, message):
+        if worker is not self.worker:
+            return
+        self.worker = None
+        self.CleanPlot()
+        self.loadBtn.setEnabled(True)
+        MessageBox("Error encountered processing data: {0}".format(message))
+
+    def PipelineCancelled(self, worker):
+        logging.debug("Pipeline cancelled for {0}".format(worker.path))
+
+    def StartWatching(self, path):
+        self.StopWatching()
+        logging.debug("Watching {0} for new readings".format(path))
+        self.watcher.addPath(path)
+
+    def StopWatching(self):
+        self.watchTimer.stop()
+        if self.tailWorker is not None:
+            self.tailWorker.Cancel()
+            self.tailWorker = None
+        if self.watcher.files():
+            self.watcher.removePaths(self.watcher.files())
+
+    def FileChanged(self, path):
+        # editors and exporters that replace the file drop it from the watcher
+        if path not in self.watcher.files() and os.path.isfile(path):
+            self.watcher.addPath(path)
+        self.watchTimer.start()
+
+    def PollFile(self):
+        if self.readings is None or not self.watcher.files():
+            return
+        if self.worker is not None or self.tailWorker is not None:
+            self.watchTimer.start()
+            return
+        worker = self.tailWorker = TailWorker(self, self.readings.source)
+        worker.signals.finished.connect(partial(self.TailFinished, worker))
+        worker.signals.error.connect(partial(self.TailFailed, worker))
+        self.threadPool.start(worker)
 
-        self.CreatePlot(days, temps, high, low, status, sn, times)
+    def TailFinished(self, worker, result):
+        if worker is not self.tailWorker or worker.cancelled:
+            return
+        self.tailWorker = None
+        new, prepared = result
+        if new is None:
+            logging.info("{0} was rewritten, reloading".format(worker.path))
+            self.StartPipeline(worker.path)
+            return
+        if not new:
+            return
+        first = len(self.readings)
+        new = self.readings.Extend(new, prepared)
+        if not new:
+            return
+        logging.debug("Appended {0} readings from {1}".format(len(new), worker.path))
+        model = self.tableView.model()
+        if model is not None:
+            model.RowsAppended(first)
+        self.StreamReadings(new, first)
+
+    def TailFailed(self, worker, message):
+        if worker is not self.tailWorker:
+            return
+        self.tailWorker = None
+        self.StopWatching()
+        MessageBox("Error encountered watching file: {0}".format(message))
 
-    def ReadData(self):
+    def StreamReadings(self, new, first):
+        """
+        Push appended readings into the loaded plot and HTML table without reloading the pages
+        """
+        if self.plotServer is not None:
+            self.plotServer.Stream(self.readings, new)
+        else:
+            columns = {name: value.tolist() if hasattr(value, "tolist") else value
+                       for name, value in PlotColumns(new).items()}
+            columns['Day'] = (new.stamps * 1000).tolist()
+            outOfLimit = [int(index) for index in new.OutOfLimit().nonzero()[0]]
+            self.webView.page().mainFrame().evaluateJavaScript(
+                STREAM_SCRIPT.format(json.dumps(columns), json.dumps(outOfLimit)))
+        if self.webViewTable.isVisible():
+            # the rolling columns need the earlier readings, so format the new rows from the whole store
+            self.webViewTable.page().mainFrame().evaluateJavaScript(
+                TABLE_SCRIPT.format(json.dumps(TableRows(self.readings, first))))
+
+    def ReadData(self, path, worker):
         logging.debug("Begin reading temperature data")
-        temps = []
-        days = []
-        times = []
-        status = []
-        sn = []
-        high = []
-        low = []
-
-        try:
-            with open(self.fname[0]) as file:
-                data = json.load(file)
-            for item in data["Readings"]:
-                temps.append(item["AvgTemp"])
-                days.append("{0}-{1}-{2}".format(item["Date"][5:7], item["Date"][8:], item["Date"][0:4]))
-                high.append(item["HighRange"])
-                low.append(item["LowRange"])
-                times.append(item["Time"])
-                status.append(item["Status"])
-                sn.append(item["SN"])
-            return days, high, low, temps, status, sn, times
-        except Exception as ex:
-            MessageBox("Error opening file {0}".format(ex))
-            logging.error("Exception occurred reading data: {0}".format(ex))
-            return None, None, None, None, None, None, None
+        with self.metrics.Stage("ReadData", path) as stage:
+            readings = LoadReadings(path, self.cache, worker.IsCancelled)
+            if self.dateRange is not None:
+                readings = readings.Between(*self.dateRange)
+            stage["rows"] = len(readings)
+        return readings
 
 
     def CleanPlot(self):
         logging.debug("clean plots on the UI")
+        self.StopWatching()
         self.webView.setVisible(False)
         self.webViewTable.setVisible(False)
+        self.tableView.setVisible(False)
+        self.tableView.setModel(None)
         self.webView.setEnabled(False)
         self.webViewTable.setEnabled(False)
         self.plotTabLbl.setText("Select file to load.")
@@ -186,238 +589,106 @@ class TempReaderApp(QMainWindow, Ui_MainWindow):
         self.tableTabLbl.setVisible(True)
 
 
-    def CreatePlot(self, days, temps, high, low, status, sn, times):
-        logging.debug("Creating plot of temperature data")
-        degree = u"\u00b0"
-        # upper = [high[0]] * len(days)
-        # lower = [low[0]] * len(days)
-
-        self.openbrowser = True if self.browser.checkState(0) == 2 else False
-        self.saveFiles = True if self.sav_img.checkState(0) == 2 else False
+    def CreatePlot(self, readings, worker):
+        with self.metrics.Stage("CreatePlot", readings.source, len(readings)):
+            return self.WriteOutputs(readings, worker)
 
-        # image = 'png'
-        img_plot_filename = 'img_TempReadingsPlot.png'
-        img_table_filename = 'img_TempReadingsTable.png'
-
-        # output to static HTML file
-        output_file("temp_plot.html")
-        tools = ["box_select", "hover", "reset"]
-        # create a new plot
-        p = figure(plot_height=700, plot_width=1000, tools=tools, x_axis_label='Days', x_minor_ticks=len(days),
-                   y_axis_label='Temperature ({0}C)'.format(degree), x_axis_type="datetime", toolbar_location="right",
-                   title="All Temperature Readings")
-        p_filtered = figure(plot_height=700, plot_width=1000, tools=tools, x_axis_label='Days',
-                                x_minor_ticks=len(days),
-                                y_axis_label='Temperature ({0}C)'.format(degree), x_axis_type="datetime",
-                                toolbar_location="right",
-                                title="Out of Limit Temperature Readings")
-
-        from datetime import datetime
-        daysF = None
-        try:
-            daysF = [datetime(int(x[6:]),int(x[0:2]),int(x[3:5])) for x in days]
-        except Exception as ex:
-            logging.warning("Could not convert to date time object: {0}".format(ex))
-            MessageBox("Error encountered processing data: {0}".format(ex))
-
-        source = ColumnDataSource(data={
-            'Day': daysF,  # python datetime object as X axis
-            'Temp': temps,
-            'Day_str': days,  # string of datetime for display in tooltip
-            'High': high,
-            'Low': low,
-            'Status': status})
-
-
-        # p.line(days, upper, legend="Upper Limit", line_width=3)
-        # p.line(days, lower, legend="Lower Limit", line_width=3)
-        filter_points =[]
-        for i, item in enumerate(temps):
-            if item < low[i] or item > high[i]:
-                filter_points.append(i)
-        view = CDSView(source=source, filters=[IndexFilter(filter_points)])
-        p_filtered.circle('Day', 'Temp', source=source, legend="Readings", line_width=3, hover_color="green", alpha=0.4,
-                   size=11, view=view)
-        # p.annulus(x=days, y=temps, color="#7FC97F",
-        #              inner_radius=0.2, outer_radius=0.5)
-
-        p_filtered.title.align = "center"
-        p_filtered.title.text_color = "navy"
-        p_filtered.title.text_font_size = "20px"
-        p_filtered.title.text_font_style = "bold"
-        p_filtered.xaxis[0].ticker.desired_num_ticks = len(days)
-        p_filtered.legend.visible = False
-        p_filtered.select_one(HoverTool).tooltips = [
-            ('Date', '@Day_str'),
-            ('Temp', '@Temp'),
-            ('High', '@High'),
-            ('Low', '@Low'),
-            ('Status', '@Status')
-            ]
-
-        p.circle('Day', 'Temp', source=source, legend="Readings", line_width=3, hover_color="green", alpha=0.4,
-                 size=11)
-        # p.annulus(x=days, y=temps, color="#7FC97F",
-        #              inner_radius=0.2, outer_radius=0.5)
-
-        p.title.align = "center"
-        p.title.text_color = "navy"
-        p.title.text_font_size = "20px"
-        p.title.text_font_style = "bold"
-        p.xaxis[0].ticker.desired_num_ticks = len(days)
-        p.legend.visible = False
-        p.select_one(HoverTool).tooltips = [
-            ('Date', '@Day_str'),
-            ('Temp', '@Temp'),
-            ('High', '@High'),
-            ('Low', '@Low'),
-            ('Status', '@Status')
-            ]
-
-        if filter_points:
-            save(column(p, p_filtered))
+    def WriteOutputs(self, readings, worker):
+        logging.debug("Creating plot of temperature data")
+        worker.Step("Building plots, please wait.")
+        # shared assets are linked from Plots/static rather than written into every page
+        static = "Plots" + os.sep + STATIC_DIR if self.sharedAssets else None
+        if self.plotServer is not None:
+            # the server builds the page from a snapshot of the readings when the view loads it
+            self.plotServer.Show(readings)
+            plotFile = self.plotServer.Url()
+            if self.openbrowser:
+                webbrowser.open(plotFile)
         else:
-            save(column(p))
-
-        try:
-            shutil.copy2(os.path.join('temp_plot.html'), os.path.join("Plots" + os.sep + "plot.html"))
-        except Exception as ex:
-            logging.warning("Could not move files: {0}".format(ex))
-            MessageBox("Error encountered processing data: {0}".format(ex))
-
-        self.createHTML(days, temps, high, low, times, status, sn)
-
-
-        if self.openbrowser:
-            import webbrowser
-            webbrowser.open(os.path.join("Plots" + os.sep + "plot.html"))
-            webbrowser.open(os.path.join("Plots" + os.sep + "HTMLTable.html"))
-
-        if self.saveFiles:
-            export_png(p, filename=img_plot_filename)
-            try:
-                shutil.move(os.path.join(img_plot_filename), os.path.join("Images" + os.sep + img_plot_filename))
-            except Exception as ex:
-                logging.warning("Could not move files: {0}".format(ex))
-                MessageBox("Error encountered processing data: {0}".format(ex))
-
-        self.ShowPlots(r"Plots\plot.html", r"Plots\HTMLTable.html")
-
-    def createHTML(self, days, temps, high, low, times, status, sn):
-        strTable = """
-                        <html>
-                        <head>
-                        <style>
-                        table{
-                                width: 100%;
-                                border-collapse: collapse;
-                                font-family: Arial, serif;
-                            }
-                            
-                            th{
-                                height: 5px;
-                                text-align: center;
-                                background-color: #003366;;
-                                color: white;
-                                border: 1px solid #008CBA;
-                            }
-                            
-                            td{
-                                height: 5px;
-                                text-align: center;
-                                border: 1px solid #008CBA;
-                                font-size: 13px;
-                            }
-                            </style>
-                            </head>
-                            <div style=overflow - x: auto;>
-                            <table>
-                            <tr>
-                            <th>Date</th>
-                            <th>Time</th>
-                            <th>Temp</th>
-                            <th>High</th>
-                            <th>Low</th>
-                            <th>Status</th>
-                            <th>SN</th>
-                            </tr>
-                            
-                            """
-        endTable ="</table></div></html>"
-
-        for i in range(len(days)):
-            if temps[i] <= high[i] and temps[i] >= low[i]:
-                strRW = "<tr><td>" + str(days[i]) + "</td><td>" + str(times[i]) + "</td><td>" + str(temps[i]) \
-                        + "</td><td>" + str(high[i])+ "</td><td>" + str(low[i]) + "</td><td>" + str(status[i]) \
-                        + "</td><td>" + str(sn[i]) + "</td></tr>"
-            else:
-                strRW = "<tr style=color:red><td>" + str(days[i]) + "</td><td>" + str(times[i]) + "</td><td>" + str(temps[i]) \
-                        + "</td><td>" + str(high[i]) + "</td><td>" + str(low[i]) + "</td><td>" + str(status[i]) \
-                        + "</td><td>" + str(sn[i]) + "</td></tr>"
-            strTable = strTable + strRW
-        strTable = strTable + endTable
-
-        with open("Plots" + os.sep + "HTMLTable.html", 'w') as html:
-            html.write(strTable)
-        return html
+            plotFile = "Plots" + os.sep + "plot.html"
+
+        # the outputs only depend on the readings, so they are written side by side; the fast table
+        # view reads the columns directly, so the HTML table is only needed for the browser
+        graph = OutputGraph(readings, "Plots", self.saveFiles, self.plotPoints, static=static, metrics=self.metrics,
+                            plot=self.plotServer is None, table=not self.fastTable or self.openbrowser,
+                            plotPath=plotFile, imagePath="Images" + os.sep + PLOT_IMAGE,
+                            filteredPath="Images" + os.sep + PLOT_IMAGE_FILTERED,
+                            reportPath="Reports" + os.sep + REPORT_FILE)
+
+        failures = {}
+        with ThreadPoolExecutor(max_workers=STAGE_WORKERS) as pool:
+            results = graph.Run(pool, partial(self.StageFinished, worker, [], len(graph)), failures.__setitem__)
+        # the window shows the plot and table, so only the images and report may fail without stopping it
+        for name in ("WritePlot", "WriteTable"):
+            if name in failures:
+                raise failures[name]
+        for name, ex in failures.items():
+            logging.warning("Could not write {0}: {1}".format(name, ex))
+            worker.Warn("Error encountered processing data: {0}".format(ex))
+
+        return plotFile, results.get("WriteTable")
+
+    def StageFinished(self, worker, finished, total, name, result):
+        finished.append(name)
+        worker.Step("{0} finished ({1} of {2}), please wait.".format(name, len(finished), total))
+        if self.openbrowser and name in ("WritePlot", "WriteTable"):
+            webbrowser.open(result)
 
     def ShowPlots(self, html, table):
         logging.debug("Showing plot")
-        self.webView.load(QUrl(os.path.join("file:///" + os.path.abspath(html))))
-        self.webViewTable.load(QUrl(os.path.join("file:///" + os.path.abspath(table))))
+        self.showStarted = time.perf_counter()
+        if html.startswith("http"):
+            self.webView.load(QUrl(html))
+        else:
+            self.webView.load(QUrl(os.path.join("file:///" + os.path.abspath(html))))
         self.webView.setEnabled(True)
-        self.webViewTable.setEnabled(False)
         self.plotTabLbl.setVisible(False)
         self.tableTabLbl.setVisible(False)
-        self.webViewTable.show()
+        if self.tableView.model() is not None:
+            self.tableView.show()
+        elif not table:
+            self.tableTabLbl.setText("See the Plot tab for batch results.")
+            self.tableTabLbl.setVisible(True)
+        else:
+            self.webViewTable.load(QUrl(os.path.join("file:///" + os.path.abspath(table))))
+            self.webViewTable.setEnabled(False)
+            self.webViewTable.show()
         self.webView.show()
         logging.debug("End Showing plot")
 
 
+    def PlotLoaded(self, ok):
+        # the plot page renders asynchronously, so ShowPlots is timed until the view finishes loading it
+        if self.showStarted is None:
+            return
+        rows = len(self.readings) if self.readings is not None else None
+        self.metrics.Record("ShowPlots", time.perf_counter() - self.showStarted, rows,
+                            self.readings.source if self.readings is not None else None)
+        self.showStarted = None
+
+    def ShowMetrics(self, record):
+        self.stages = [stage for stage in self.stages if stage["stage"] != record["stage"]] + [record]
+        text = "  ".join("{stage} {seconds:.2f}s".format(**stage) for stage in self.stages)
+        if record["peakMB"] is not None:
+            text += "  peak {0} MB".format(record["peakMB"])
+        self.metricsLbl.setText(text)
+
     def CreatePDF(self):
+        if self.readings is None:
+            MessageBox("Load a temperature file before creating the report.")
+            return
         try:
             directory = self.directory = QFileDialog.getExistingDirectory(self, 'Select directory',
                                                                           os.path.dirname(os.path.realpath(__file__)),
                                                                           QFileDialog.ShowDirsOnly)
             self.pdfEdit.setText(self.directory)
 
-            # TODO check if files exists
-            plotFilename = "img_TempReadingsPlot.png"
-            if not os.path.isfile(directory + os.sep + plotFilename):
-                logging.warning("Files are missing")
-                msg = MessageBox("Image files are missing.")
-                return
-            pdf = MyPDF()
-            pdf.alias_nb_pages()
-            pdf.set_display_mode(zoom='real', layout='default')
-            pdf.add_page("L")
-            pdf.set_font('Arial', 'B', 12)
-            pdf.set_title("Reagent Carousel Temperature Report")
-            pdf.set_author("Rick Roll")
-            # pdf.text(70.0, 5.0, "Reagent Carousel Temperature Report")
-            pdf.image(directory + os.sep + plotFilename, x=45, y=None, w=0, h=160)
-            pdf.set_x(60)
-            h = """
-            
-                        <html>
-                        <head>
-                            <table>
-                            <tr>
-                            <th width="14%">Date</th>
-                            <th width="14%">Time</th>
-                            <th width="14%">Temp</th>
-                            <th width="14%">High</th>
-                            <th width="14%">Low</th>
-                            <th width="14%">Status</th>
-                            <th width="14%">SN</th>
-                            </tr>
-                            
-                            <tr><td>09-12-2016</td><td>07:10:52 AM</td><td>8.7</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr style=color:red><td>09-13-2016</td><td>07:12:15 AM</td><td>1.2</td><td>15.0</td><td>2.0</td><td>Fail</td><td>16FMP00032</td></tr><tr><td>09-14-2016</td><td>08:08:02 AM</td><td>6.1</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-15-2016</td><td>08:14:23 AM</td><td>8.0</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-16-2016</td><td>01:43:56 PM</td><td>8.1</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-17-2016</td><td>01:45:04 PM</td><td>9.2</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-18-2016</td><td>03:17:04 PM</td><td>9.5</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-19-2016</td><td>03:40:05 PM</td><td>9.6</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-20-2016</td><td>03:40:46 PM</td><td>9.7</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-21-2016</td><td>03:42:26 PM</td><td>9.8</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-22-2016</td><td>03:43:22 PM</td><td>9.9</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-23-2016</td><td>03:45:20 PM</td><td>10.0</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-24-2016</td><td>03:47:49 PM</td><td>10.1</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-25-2016</td><td>03:48:26 PM</td><td>10.2</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-26-2016</td><td>10:13:56 AM</td><td>10.3</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-27-2016</td><td>11:40:18 AM</td><td>10.4</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-28-2016</td><td>11:41:44 AM</td><td>10.5</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-29-2016</td><td>11:43:48 AM</td><td>10.5</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>09-30-2016</td><td>01:45:21 PM</td><td>10.5</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr style=color:red><td>10-01-2016</td><td>02:00:36 PM</td><td>15.9</td><td>15.0</td><td>2.0</td><td>Fail</td><td>16FMP00032</td></tr><tr><td>10-02-2016</td><td>02:01:11 PM</td><td>10.6</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>10-03-2016</td><td>02:01:46 PM</td><td>10.5</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>10-04-2016</td><td>02:02:11 PM</td><td>10.6</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>10-05-2016</td><td>02:02:42 PM</td><td>10.4</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>10-06-2016</td><td>02:03:14 PM</td><td>10.5</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>10-07-2016</td><td>02:03:52 PM</td><td>10.5</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>10-08-2016</td><td>02:04:32 PM</td><td>10.6</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>10-09-2016</td><td>02:04:58 PM</td><td>13.5</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>10-10-2016</td><td>02:45:23 PM</td><td>10.6</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>10-11-2016</td><td>09:45:16 AM</td><td>11.0</td><td>15.0</td><td>2.0</td><td>Pass</td><td>16FMP00032</td></tr><tr><td>10-12-2016</td><td>09:47:09 AM</td><td>11.0</td><td>15.0</td><td>8.0</td><td>Pass</td><td>16FMP00032</td></tr></table></div></html>
-            """
-            pdf.write_html(h)
-            outputFile = "Reports" + os.sep + 'TempReadingsReport.pdf'
-            pdf.output(outputFile, "F")
-            pdf.close()
+            plotFilename = directory + os.sep + PLOT_IMAGE
+            if not os.path.isfile(plotFilename):
+                logging.warning("Plot image is missing, report will only contain the table")
+                plotFilename = None
+            with self.metrics.Stage("CreatePDF", self.readings.source, len(self.readings)):
+                outputFile = WriteReport(self.readings, "Reports" + os.sep + REPORT_FILE, plotFilename)
             print("open file")
             subprocess.Popen([outputFile], shell=True)
         except Exception as ex:
@@ -427,6 +698,10 @@ class TempReaderApp(QMainWindow, Ui_MainWindow):
 
 
     def Reset(self):
+        if self.worker is not None:
+            self.worker.Cancel()
+            self.worker = None
+        self.readings = None
         self.CleanPlot()
         self.fileEdit.setText('')
         self.pdfEdit.setText('')
@@ -434,49 +709,10 @@ class TempReaderApp(QMainWindow, Ui_MainWindow):
 
 
     def Exit(self):
+        if self.plotServer is not None:
+            self.plotServer.Stop()
         sys.exit(0)
 
-
-class MyPDF(fpdf.FPDF, HTMLMixin):
-    def __init__(self, orientation='P', unit='mm', format='A4'):
-        super().__init__(orientation='P', unit='mm', format='A4')
-
-
-    def header(self):
-        """
-        Header on each page
-        """
-        # set the font for the header, B=Bold
-        self.set_font("Arial", style="B", size=15)
-
-        # insert my logo
-        self.image("Icons" + os.sep + "Thermometer.png", x=90, y=5, w=15)
-        # position logo on the right
-        self.cell(w=80)
-
-        # page title
-        self.cell(120.0, 5.0, "Reagent Carousel Temperature Report", ln=0, align="C")
-
-        # insert a line break of 20 pixels
-        self.ln(15)
-
-    def footer(self):
-        """
-        Footer on each page
-        """
-        # set the font, I=italic
-        self.set_font("Arial", style="B", size=9)
-
-        # position footer at 15mm from the bottom
-        self.set_y(-15)
-
-        # display the page number and center it
-        pageNum = "Page %s of {nb}" % self.page_no()
-        self.cell(0, 10, pageNum, align="C")
-
-
-
-
 class MessageBox(QWidget):
 
     def __init__(self, message):
@@ -516,13 +752,16 @@ class MessageBox(QWidget):
         self.show()
 
 
-app = QApplication(sys.argv)
-app.setStyle("fusion")
-splash_image = QPixmap("Icons" + os.sep + "ThermometerR.png").scaled(200, 200, QtCore.Qt.KeepAspectRatio)
-splash = QSplashScreen(splash_image)
-splash.show()
-time.sleep(1)
-myApp = TempReaderApp()
-myApp.show()
-splash.finish(myApp)
-app.exec_()
+if __name__ == "__main__":
+    # batch workers re-import this module, so only the launching process builds the GUI
+    multiprocessing.freeze_support()
+    app = QApplication(sys.argv)
+    app.setStyle("fusion")
+    splash_image = QPixmap("Icons" + os.sep + "ThermometerR.png").scaled(200, 200, QtCore.Qt.KeepAspectRatio)
+    splash = QSplashScreen(splash_image)
+    splash.show()
+    app.processEvents()
+    myApp = TempReaderApp(profile="--profile" in sys.argv)
+    myApp.show()
+    splash.finish(myApp)
+    app.exec_()
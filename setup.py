@@ -27,7 +27,8 @@ setup(  name = "TempReaderApp",
         version = "0.1",
         description = "Reagent Carousel Temperature Reader",
         options = {'build_exe': {'includes':includes,'excludes':excludes,'packages':packages,'include_files':includefiles}},
-		executables = [Executable("TempReaderApp.py", icon='Images\\ThermometerIcon.ico', base = "Win32GUI")])
+		executables = [Executable("TempReaderApp.py", icon='Images\\ThermometerIcon.ico', base = "Win32GUI"),
+					   Executable("TempReader.py", targetName="tempreader.exe", icon='Images\\ThermometerIcon.ico')])
 		
 # cxfreeze hello.py --target-dir dist --icon=ICON
 # python setup.py bdist_msi
@@ -0,0 +1,11 @@
+#  conftest.py
+#  TempReadings
+#
+#  Copyright(c) 2017.  All Rights Reserved.
+# -------------------------------------------------------
+
+import os
+import sys
+
+# the modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
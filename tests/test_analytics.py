@@ -0,0 +1,155 @@
+#  test_analytics.py
+#  TempReadings
+#
+#  Copyright(c) 2017.  All Rights Reserved.
+# -------------------------------------------------------
+
+"""Checks the vectorized statistics against naive per-row loops on a synthetic multi-SN export"""
+import numpy
+import pytest
+
+from Benchmark import GenerateExport
+from TempReader import ROLLING_WINDOW, Decimate, ReadFile, Runs, SerialIndex
+
+WINDOWS = (600, 3600)
+
+
+@pytest.fixture(scope="module")
+def readings(tmp_path_factory):
+    path = tmp_path_factory.mktemp("exports") / "8500_RCTT.json"
+    return ReadFile(str(GenerateExport(str(path), 3000, outOfLimit=0.3, serials=5, seed=7)))
+
+
+def SerialRows(readings):
+    """
+    Row numbers of each serial in time order, by SN code
+    """
+    return {code: sorted(numpy.flatnonzero(readings.sn == code).tolist(), key=lambda row: readings.stamps[row])
+            for code in numpy.unique(readings.sn).tolist()}
+
+
+def NaiveRuns(readings, rows):
+    """
+    (start, end, rows, peak) of each run of out-of-limit readings in rows, the latest reading
+    with the largest excess being the peak
+    """
+    runs, current = [], []
+    for row in rows + [None]:
+        if row is not None and not readings.low[row] <= readings.temps[row] <= readings.high[row]:
+            current.append(row)
+            continue
+        if current:
+            excess = [max(readings.temps[r] - readings.high[r], readings.low[r] - readings.temps[r]) for r in current]
+            peak = current[len(excess) - 1 - excess[::-1].index(max(excess))]
+            runs.append((int(readings.stamps[current[0]]), int(readings.stamps[current[-1]]), len(current),
+                         float(readings.temps[peak])))
+            current = []
+    return runs
+
+
+@pytest.mark.parametrize("window", WINDOWS)
+def test_rolling_statistics_match_naive_windows(readings, window):
+    analytics = readings.Analyze(window)
+    for rows in SerialRows(readings).values():
+        for position, row in enumerate(rows):
+            inside = [other for other in rows[:position + 1] if readings.stamps[other] > readings.stamps[row] - window]
+            temps = readings.temps[inside]
+            assert analytics.mean[row] == pytest.approx(temps.mean(), abs=1e-9)
+            # the prefix sums leave some rounding in the variance of a flat window
+            assert analytics.std[row] == pytest.approx(temps.std(), abs=1e-5)
+            # each reading holds until the next one, counted while the next is still in the window
+            held = [(readings.stamps[after] - readings.stamps[before], readings.temps[before] - readings.high[before],
+                     readings.low[before] - readings.temps[before]) for before, after in zip(inside, inside[1:])]
+            assert analytics.above[row] == sum(seconds for seconds, over, under in held if over > 0)
+            assert analytics.below[row] == sum(seconds for seconds, over, under in held if under > 0)
+
+
+def test_excursions_match_naive_runs(readings):
+    expected = []
+    for code, rows in SerialRows(readings).items():
+        expected += [(readings.snTable[code],) + run for run in NaiveRuns(readings, rows)]
+    excursions = readings.Analyze().Excursions()
+    assert len(excursions) == len(expected)
+    assert sorted((serial, rows, peak) for serial, start, end, duration, rows, peak in excursions) == \
+        sorted((serial, rows, peak) for serial, start, end, rows, peak in expected)
+    durations = [duration.total_seconds() for serial, start, end, duration, rows, peak in excursions]
+    assert durations == sorted(durations, reverse=True)
+    assert sorted(durations) == sorted(end - start for serial, start, end, rows, peak in expected)
+
+
+def test_runs_split_at_group_breaks():
+    random = numpy.random.RandomState(3)
+    for _ in range(200):
+        mask = random.random_sample(40) < 0.6
+        breaks = numpy.unique(random.randint(0, 40, 5))
+        starts, stops = Runs(mask, breaks)
+        expected, start = [], None
+        for position in range(len(mask) + 1):
+            if start is not None and (position == len(mask) or not mask[position] or position in breaks):
+                expected.append((start, position))
+                start = None
+            if start is None and position < len(mask) and mask[position]:
+                start = position
+        assert list(zip(starts.tolist(), stops.tolist())) == expected
+
+
+def test_serial_index_longest_excursion(readings):
+    index = SerialIndex(readings)
+    for position, (code, rows) in enumerate(sorted(SerialRows(readings).items())):
+        assert index.codes[position] == code
+        assert index.Order()[index.starts[position]:index.stops[position]].tolist() == rows
+        runs = NaiveRuns(readings, rows)
+        assert index.outOfLimit[position] == sum(run[2] for run in runs)
+        # longest by duration, then by readings, the later run on a tie
+        longest = max(reversed(runs), key=lambda run: (run[1] - run[0], run[2])) if runs else (0, 0, 0, None)
+        assert (index.excursionSeconds[position], index.excursionRows[position]) == \
+            (longest[1] - longest[0], longest[2])
+        assert index.excursionStart[position] == longest[0]
+
+
+def NaiveDecimate(x, y, target):
+    """
+    Largest-Triangle-Three-Buckets one point at a time, with the bucket edges Decimate uses
+    """
+    edges = numpy.linspace(1, len(x) - 1, target - 1).astype(numpy.int64).tolist()
+    keep, selected = [0], 0
+    for bucket in range(target - 2):
+        following = range(edges[bucket + 1], edges[bucket + 2] if bucket + 2 < len(edges) else len(x))
+        averageX = sum(x[point] for point in following) / len(following)
+        averageY = sum(y[point] for point in following) / len(following)
+        areas = [abs((x[selected] - averageX) * (y[point] - y[selected]) -
+                     (x[selected] - x[point]) * (averageY - y[selected]))
+                 for point in range(edges[bucket], edges[bucket + 1])]
+        selected = edges[bucket] + areas.index(max(areas))
+        keep.append(selected)
+    return keep + [len(x) - 1]
+
+
+@pytest.mark.parametrize("target", (3, 10, 97, 500))
+def test_decimate_matches_naive_lttb(readings, target):
+    rows = SerialRows(readings)[0]
+    x = readings.stamps[rows].astype(numpy.float64)
+    y = readings.temps[rows]
+    assert Decimate(x, y, target).tolist() == NaiveDecimate(x.tolist(), y.tolist(), target)
+
+
+def test_decimate_keeps_short_series():
+    assert Decimate(numpy.arange(5), numpy.arange(5), 10).tolist() == list(range(5))
+
+
+def test_extend_matches_a_fresh_store(readings):
+    store = readings.Take(slice(0, 2000))
+    store.Analyze()
+    store.BySerial()
+    for first, last in ((2000, 2001), (2001, 2400), (2400, 3000)):
+        new = readings.Take(slice(first, last))
+        store.Extend(new, store.Prepare(new))
+    fresh = readings.Take(slice(0, len(readings)))
+    assert store.serialIndex is not None and ROLLING_WINDOW in store.analytics
+    assert numpy.allclose(store.Analyze().mean, fresh.Analyze().mean)
+    assert numpy.allclose(store.Analyze().std, fresh.Analyze().std, atol=1e-5)
+    assert (store.Analyze().above == fresh.Analyze().above).all()
+    assert store.Analyze().Excursions() == fresh.Analyze().Excursions()
+    assert (store.BySerial().Order() == fresh.BySerial().Order()).all()
+    assert (store.BySerial().excursionSeconds == fresh.BySerial().excursionSeconds).all()
+    assert (store.OutOfLimit() == fresh.OutOfLimit()).all()